@@ -1,19 +1,57 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from flask_cors import CORS
-import requests
-import sqlite3
 import os
 import json
 import threading
 import time
 import ftplib
-import io
-from beem import Hive
-from beem.account import Account
-from beem.exceptions import AccountDoesNotExistsException
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from orderbook import Order, OrderBook
+from units import to_units, from_units
+from market_cache import MarketDataCache
+from hive_engine import HIVE_ENGINE_API, client as hive_engine
+from streaming import PairFeed
+from trade_store import TradeStore, TradeSync, MAX_PAGE_SIZE as MAX_TRADE_PAGE
+from candles import CandleEngine, INTERVALS as CANDLE_INTERVALS
+from hive_chain import chain as hive_chain, rpc as hive_rpc
+from db import Database, FutureTimeoutError, GroupCommitWriter
+from replication import SnapshotUploader
+from journal import OrderJournal, retrieve_to_file
+from broadcaster import BeemTradeChain, BroadcastQueue
+from bulk_import import import_orders, iter_json_array
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics
+from leader import LeaderElection
+from book_depth import MAX_PRECISION, build_depth
+from http_cache import Payload, PayloadMemo, respond
+from price_fetcher import StalePriceError, engine as price_engine
+from startup import StartupTracker
 
-app = Flask(__name__)
-CORS(app)
+# Startup timings (since process start) and background startup tasks, for /api/ready
+startup = StartupTracker()
+
+# Routes live on a blueprint; create_app() builds the Flask app around it
+api = Blueprint('api', __name__)
+
+# Per-route request latency, observed around every request
+REQUEST_LATENCY = metrics.histogram('peakedex_http_request_duration_seconds',
+                                    'Flask request latency by route template',
+                                    ('route', 'method', 'status'))
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def observe_request_latency(response):
+    if 'first_response' not in startup.phases:
+        startup.mark('first_response')
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+    return response
 
 SUPPORTED_PAIRS = [
     ("PEK", "SWAP.HIVE"),
@@ -26,10 +64,28 @@ SUPPORTED_PAIRS = [
     ("PEK", "PIMP"),  # Added PEK/PIMP trading pair
 ]
 
-HIVE_ENGINE_MARKET_API = "https://api.hive-engine.com/rpc/contracts"
+HIVE_ENGINE_MARKET_API = HIVE_ENGINE_API
+
+# Shared cache for Hive Engine market data (seconds / entries)
+market_cache = MarketDataCache(
+    ttl=float(os.environ.get('MARKET_CACHE_TTL', '2')),
+    stale_ttl=float(os.environ.get('MARKET_CACHE_STALE_TTL', '30')),
+    max_entries=int(os.environ.get('MARKET_CACHE_SIZE', '512')),
+)
 
 DB_PATH = 'orders.db'
+TRADE_SYNC_INTERVAL = float(os.environ.get('TRADE_SYNC_INTERVAL', '5'))
+
+db = Database(DB_PATH)
+# /api/order inserts share transactions (and fsyncs) through this writer
+order_writer = GroupCommitWriter(db)
+# Seconds /api/order waits for the writer before answering 503
+ORDER_WRITE_TIMEOUT = float(os.environ.get('ORDER_WRITE_TIMEOUT', '10'))
+trade_store = TradeStore(db)
+candles = CandleEngine(db)
 FTP_CONFIG_PATH = 'ftp_config.json'
+# FTP_BACKUP=off disables the FTP restore and backup entirely (benchmarks, local runs)
+FTP_BACKUP_ENABLED = os.environ.get('FTP_BACKUP', 'on').lower() not in ('0', 'off', 'false', 'no')
 
 # Map quote asset to account
 PAIR_ACCOUNT_MAP = {
@@ -39,25 +95,99 @@ PAIR_ACCOUNT_MAP = {
 }
 DEFAULT_ACCOUNT = 'peakecoin.matic'
 
+# Schema version stored in PRAGMA user_version
+# 0: amount/price as TEXT
+# 1: amount/price as INTEGER fixed-point units plus the book index
+SCHEMA_VERSION = 1
+
+ORDERS_TABLE_SQL = '''CREATE TABLE orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT,
+    base TEXT,
+    quote TEXT,
+    amount INTEGER,
+    price INTEGER,
+    side TEXT,
+    status TEXT DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+def migrate_orders_v1(c):
+    """Rewrite TEXT amount/price columns as integer units, keeping order ids"""
+    c.execute('ALTER TABLE orders RENAME TO orders_v0')
+    c.execute(ORDERS_TABLE_SQL)
+    c.execute('SELECT id, username, base, quote, amount, price, side, status, created_at FROM orders_v0')
+    rows = []
+    for order_id, username, base, quote, amount, price, side, status, created_at in c.fetchall():
+        try:
+            amount_units = to_units(amount, base)
+            price_units = to_units(price, quote)
+        except ValueError:
+            print(f"Order {order_id} has invalid amount/price ({amount!r}, {price!r}), marking rejected")
+            amount_units, price_units, status = 0, 0, 'rejected'
+        else:
+            # Filled orders keep amount 0; a pending one that truncates to nothing can never match
+            if status == 'pending' and (amount_units <= 0 or price_units <= 0):
+                print(f"Order {order_id} rounds to zero units ({amount!r}, {price!r}), marking rejected")
+                status = 'rejected'
+        rows.append((order_id, username, base, quote, amount_units, price_units, side, status, created_at))
+    c.executemany('''INSERT INTO orders (id, username, base, quote, amount, price, side, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    c.execute('DROP TABLE orders_v0')
+
 def init_db():
-    if not os.path.exists(DB_PATH):
-        conn = sqlite3.connect(DB_PATH)
+    with db.connection() as conn:
         c = conn.cursor()
-        c.execute('''CREATE TABLE orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            base TEXT,
-            quote TEXT,
-            amount TEXT,
-            price TEXT,
-            side TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
+        # Every worker runs this at startup; take the write lock first so only one migrates
+        c.execute('BEGIN IMMEDIATE')
+        version = c.execute('PRAGMA user_version').fetchone()[0]
+        exists = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='orders'").fetchone()
+        if not exists:
+            c.execute(ORDERS_TABLE_SQL)
+        elif version < 1:
+            migrate_orders_v1(c)
+        # Best bid/ask per pair is an index seek on this
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_orders_book
+                     ON orders (base, quote, side, status, price, created_at)''')
+        # Keyset pagination for /api/orders: each filter walks an index in id order
+        c.execute('CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (username, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_orders_pair ON orders (base, quote, id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, id)')
+        # Pairs whose resident book must be rebuilt by the leader (after an import, from any worker)
+        c.execute('CREATE TABLE IF NOT EXISTS book_reloads (base TEXT, quote TEXT, PRIMARY KEY (base, quote))')
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
-        conn.close()
+    order_journal.init_db()
+    broadcasts.init_db()
+    trade_store.init_db()
+    candles.init_db()
+
+def order_row_to_dict(row):
+    return {
+        'id': row[0],
+        'username': row[1],
+        'base': row[2],
+        'quote': row[3],
+        'amount': from_units(row[4], row[2]),
+        'price': from_units(row[5], row[3]),
+        'side': row[6],
+        'status': row[7],
+        'created_at': row[8]
+    }
 
-init_db()
+# Incremental FTP backup: compressed NDJSON segments plus periodic snapshots
+order_journal = OrderJournal(db, order_row_to_dict,
+                             snapshot_every=int(os.environ.get('JOURNAL_SNAPSHOT_EVERY', '50')),
+                             # Shared by every worker: a manual upload waits for the leader's and vice versa
+                             lock_path=f'{DB_PATH}.backup')
+
+def account_active_key(account):
+    return os.environ.get(f"PEAKECOIN_{account.split('.')[-1].upper()}_ACTIVE_KEY", "")
+
+# Matched trades are queued durably and broadcast by a worker pool, batched per account
+broadcasts = BroadcastQueue(db, BeemTradeChain(hive_rpc, account_active_key),
+                            workers=int(os.environ.get('BROADCAST_WORKERS', '2')),
+                            max_batch=int(os.environ.get('BROADCAST_BATCH_SIZE', '10')),
+                            expiry_margin=float(os.environ.get('BROADCAST_EXPIRY_MARGIN', '60')))
 
 # FTP config helpers
 
@@ -66,7 +196,7 @@ def save_ftp_config(config):
         json.dump(config, f)
 
 def load_ftp_config():
-    if not os.path.exists(FTP_CONFIG_PATH):
+    if not FTP_BACKUP_ENABLED or not os.path.exists(FTP_CONFIG_PATH):
         return None
     with open(FTP_CONFIG_PATH, 'r') as f:
         return json.load(f)
@@ -77,214 +207,530 @@ def erase_ftp_config():
 
 # FTP upload/download helpers
 
+# Connect/read timeout, so an unreachable FTP host cannot hang a worker thread
+FTP_TIMEOUT = float(os.environ.get('FTP_TIMEOUT', '15'))
+
+def connect_ftp(config):
+    ftp = ftplib.FTP(config['host'], timeout=FTP_TIMEOUT)
+    try:
+        ftp.login(config['user'], config['password'])
+    except Exception:
+        ftp.close()
+        raise
+    return ftp
+
+FTP_UPLOAD_DURATION = metrics.histogram('peakedex_ftp_upload_duration_seconds',
+                                        'Duration of FTP order backup uploads', ('result',),
+                                        buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+
 def upload_orders_to_ftp():
     config = load_ftp_config()
     if not config:
         return False, 'No FTP config set.'
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM orders')
-    rows = c.fetchall()
-    conn.close()
-    orders = [
-        {
-            'id': row[0],
-            'username': row[1],
-            'base': row[2],
-            'quote': row[3],
-            'amount': row[4],
-            'price': row[5],
-            'side': row[6],
-            'status': row[7],
-            'created_at': row[8]
-        } for row in rows
-    ]
-    orders_json = json.dumps({'orders': orders}, indent=2)
+    started = time.perf_counter()
     try:
-        with ftplib.FTP(config['host']) as ftp:
-            ftp.login(config['user'], config['password'])
-            ftp.storbinary('STOR orders.json', io.BytesIO(orders_json.encode('utf-8')))
-        return True, 'Upload successful.'
+        with connect_ftp(config) as ftp:
+            message = order_journal.upload(ftp)
     except Exception as e:
+        FTP_UPLOAD_DURATION.observe(time.perf_counter() - started, 'error')
         return False, str(e)
+    FTP_UPLOAD_DURATION.observe(time.perf_counter() - started, 'ok')
+    return True, message
+
+def upload_orders_snapshot():
+    ok, msg = upload_orders_to_ftp()
+    if not ok:
+        raise Exception(msg)
+
+# One background uploader; order writes just mark the backup dirty
+replicator = SnapshotUploader(
+    upload_orders_snapshot,
+    debounce=float(os.environ.get('FTP_UPLOAD_DEBOUNCE', '5')),
+    max_latency=float(os.environ.get('FTP_UPLOAD_MAX_DELAY', '30')),
+)
+
+# Backpressure: past this many order changes not yet backed up, new orders are
+# refused with 503 until the backup catches up (0 disables)
+FTP_BACKUP_MAX_BACKLOG = int(os.environ.get('FTP_BACKUP_MAX_BACKLOG', '10000'))
+BACKUP_RETRY_AFTER = 30
+
+def backup_backlog_exceeded():
+    """The journal backlog if it is over FTP_BACKUP_MAX_BACKLOG, else None"""
+    if not FTP_BACKUP_MAX_BACKLOG or load_ftp_config() is None:
+        return None
+    backlog = order_journal.backlog()
+    return backlog if backlog > FTP_BACKUP_MAX_BACKLOG else None
+
+def backup_backpressure():
+    """A 503 response while the FTP backup is too far behind, else None"""
+    backlog = backup_backlog_exceeded()
+    if backlog is None:
+        return None
+    return (jsonify({'error': f'Order backup is {backlog} changes behind; try again later'}), 503,
+            {'Retry-After': str(BACKUP_RETRY_AFTER)})
+
+def iter_ftp_order_records(ftp):
+    """Yield (op, order) records from the FTP backup, parsed incrementally.
+
+    Journal backups are replayed snapshot-first; otherwise the legacy
+    orders.json dump is spooled to a temp file and stream-parsed.
+    """
+    records = order_journal.read_remote(ftp)
+    if records is not None:
+        for record in records:
+            yield record['op'], record['order']
+        return
+    with retrieve_to_file(ftp, 'orders.json') as f:
+        for order in iter_json_array(f, 'orders'):
+            yield 'upsert', order
 
 def download_orders_from_ftp():
     config = load_ftp_config()
     if not config:
         return None, 'No FTP config set.'
     try:
-        with ftplib.FTP(config['host']) as ftp:
-            ftp.login(config['user'], config['password'])
-            r = io.BytesIO()
-            ftp.retrbinary('RETR orders.json', r.write)
-            r.seek(0)
-            return json.loads(r.read().decode('utf-8')), None
+        with connect_ftp(config) as ftp:
+            # Replay snapshot + segments; the latest record per order wins
+            orders = {}
+            for op, order in iter_ftp_order_records(ftp):
+                if op == 'delete':
+                    orders.pop(order['id'], None)
+                else:
+                    orders[order.get('id')] = order
+            return {'orders': list(orders.values())}, None
     except Exception as e:
         return None, str(e)
 
+def import_orders_from_ftp(label='import'):
+    """Stream the FTP backup into the orders table; returns (stats, error)"""
+    config = load_ftp_config()
+    if not config:
+        return None, 'No FTP config set.'
+    try:
+        with connect_ftp(config) as ftp:
+            stats = import_orders(db, iter_ftp_order_records(ftp), label=label)
+    except Exception as e:
+        return None, str(e)
+    # Imported rows keep their original ids, below the order tailer's position,
+    # so the leader rebuilds the affected books instead
+    if stats['pairs']:
+        with db.connection() as conn:
+            conn.executemany('INSERT OR IGNORE INTO book_reloads (base, quote) VALUES (?, ?)', stats['pairs'])
+            conn.commit()
+        order_tail_wakeup.set()
+    return stats, None
+
 def erase_orders_on_ftp():
     config = load_ftp_config()
     if not config:
         return False, 'No FTP config set.'
     try:
-        with ftplib.FTP(config['host']) as ftp:
-            ftp.login(config['user'], config['password'])
-            ftp.delete('orders.json')
-        return True, 'Deleted orders.json on FTP.'
+        with connect_ftp(config) as ftp:
+            deleted = order_journal.erase_remote(ftp)
+            try:
+                ftp.delete('orders.json')
+                deleted.append('orders.json')
+            except ftplib.error_perm:
+                pass  # No legacy dump
+        return True, f"Deleted {', '.join(deleted) or 'nothing'} on FTP."
     except Exception as e:
         return False, str(e)
 
-@app.route('/api/pairs')
+def fetch_market_data(method, params):
+    """Run a Hive Engine JSON-RPC read through the shared market cache"""
+    symbol = params.get('symbol') or params.get('query', {}).get('symbol')
+    key = (method, params.get('table'), symbol, params.get('limit'))
+    return market_cache.get(key, lambda: hive_engine.call(method, params))
+
+# Encoded read responses with their ETags, rebuilt only when the underlying data changes
+payload_memo = PayloadMemo(max_entries=int(os.environ.get('PAYLOAD_MEMO_SIZE', '512')))
+
+PAIRS_PAYLOAD = Payload.json({
+    "pairs": [
+        {"base": base, "quote": quote} for base, quote in SUPPORTED_PAIRS
+    ]
+})
+
+@api.route('/api/pairs')
 def api_pairs():
-    return jsonify({
-        "pairs": [
-            {"base": base, "quote": quote} for base, quote in SUPPORTED_PAIRS
-        ]
-    })
+    return respond(PAIRS_PAYLOAD, 'public, max-age=300')
+
+ORDERBOOK_FORMATS = ('raw', 'levels', 'compact')
+MAX_ORDERBOOK_DEPTH = 500
 
-@app.route('/api/orderbook')
+@api.route('/api/orderbook')
 def api_orderbook():
     base = request.args.get('base', 'PEK').upper()
     quote = request.args.get('quote', 'SWAP.HIVE').upper()
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "getOrderBook",
-        "params": {
-            "symbol": f"{base}:{quote}",
-            "limit": 50
-        }
-    }
+    # Any depth option implies aggregated levels; with none, the upstream book is relayed as-is
+    aggregate = any(arg in request.args for arg in ('depth', 'precision', 'cumulative'))
+    fmt = request.args.get('format', 'levels' if aggregate else 'raw').lower()
+    if fmt not in ORDERBOOK_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(ORDERBOOK_FORMATS)}"}), 400
     try:
-        r = requests.post(HIVE_ENGINE_MARKET_API, json=payload, timeout=10)
-        data = r.json()
-        return jsonify(data)
+        depth = int(request.args['depth']) if 'depth' in request.args else None
+        precision = int(request.args['precision']) if 'precision' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'depth and precision must be integers'}), 400
+    if depth is not None and not 1 <= depth <= MAX_ORDERBOOK_DEPTH:
+        return jsonify({'error': f'depth must be between 1 and {MAX_ORDERBOOK_DEPTH}'}), 400
+    if precision is not None and not 0 <= precision <= MAX_PRECISION:
+        return jsonify({'error': f'precision must be between 0 and {MAX_PRECISION}'}), 400
+    cumulative = request.args.get('cumulative', '').lower() in ('1', 'true', 'yes')
+    try:
+        result = fetch_market_data("getOrderBook", {"symbol": f"{base}:{quote}", "limit": 50})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    # The cached upstream book is the version: payloads are rebuilt when the market cache refreshes it
+    if fmt == 'raw':
+        payload = payload_memo.get(('orderbook', base, quote), result,
+                                   lambda: {"jsonrpc": "2.0", "id": 1, "result": result})
+    else:
+        compact = fmt == 'compact'
+        payload = payload_memo.get(('depth', base, quote, compact, depth, precision, cumulative), result,
+                                   lambda: build_depth(result, base, quote, depth, precision, cumulative, compact))
+    return respond(payload, f'public, max-age={int(market_cache.ttl)}')
 
-@app.route('/api/history')
+@api.route('/api/history')
 def api_history():
     base = request.args.get('base', 'PEK').upper()
     quote = request.args.get('quote', 'SWAP.HIVE').upper()
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "find",
-        "params": {
-            "contract": "market",
-            "table": "trades",
-            "query": {"symbol": f"{base}:{quote}"},
-            "limit": 50,
-            "sort": "desc"
-        }
-    }
+    # Served from the local trades table kept current by TradeSync
     try:
-        r = requests.post(HIVE_ENGINE_MARKET_API, json=payload, timeout=10)
-        data = r.json()
-        return jsonify({'result': data.get('result', [])})
+        before = request.args.get('before', type=int)
+        limit = max(1, min(request.args.get('limit', 50, type=int), MAX_TRADE_PAGE))
+        # Trades are only ever appended, so the newest stored id versions every page
+        version = trade_store.last_trade_id(base, quote)
+        def build():
+            trades = trade_store.page(base, quote, before=before, limit=limit)
+            next_before = trades[-1]['_id'] if len(trades) == limit else None
+            return {'result': trades, 'next_before': next_before}
+        payload = payload_memo.get(('history', base, quote, before, limit), version, build)
+        # Pages behind a cursor hold older trades only and do not change
+        return respond(payload, 'public, max-age=300' if before is not None else f'public, max-age={int(TRADE_SYNC_INTERVAL)}')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def delayed_ftp_upload(delay=30):
-    def upload():
-        time.sleep(delay)
-        upload_orders_to_ftp()
-    threading.Thread(target=upload, daemon=True).start()
+@api.route('/api/candles')
+def api_candles():
+    base = request.args.get('base', 'PEK').upper()
+    quote = request.args.get('quote', 'SWAP.HIVE').upper()
+    interval = request.args.get('interval', '1h')
+    if interval not in CANDLE_INTERVALS:
+        return jsonify({'error': f"interval must be one of {', '.join(CANDLE_INTERVALS)}"}), 400
+    try:
+        result = candles.query(base, quote, interval,
+                               start=request.args.get('from', type=int),
+                               end=request.args.get('to', type=int))
+        return jsonify({'base': base, 'quote': quote, 'interval': interval, 'candles': result})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-@app.route('/api/order', methods=['POST'])
-def api_order():
-    data = request.json
-    base = data.get('base', 'PEK').upper()
-    quote = data.get('quote', 'SWAP.HIVE').upper()
+# --- Streaming order book / trade updates ---
+
+STREAM_POLL_INTERVAL = float(os.environ.get('STREAM_POLL_INTERVAL', '1'))
+STREAM_KEEPALIVE = 15
+
+PAIR_FEEDS = {}
+_pair_feeds_lock = threading.Lock()
+
+def get_pair_feed(base, quote):
+    with _pair_feeds_lock:
+        feed = PAIR_FEEDS.get((base, quote))
+        if feed is None:
+            feed = PAIR_FEEDS[(base, quote)] = PairFeed(
+                base, quote,
+                fetch_book=lambda: fetch_market_data("getOrderBook", {"symbol": f"{base}:{quote}", "limit": 50}),
+                fetch_trades=lambda: trade_store.page(base, quote, limit=50),
+                interval=STREAM_POLL_INTERVAL,
+            )
+        return feed
+
+@api.route('/api/stream')
+def api_stream():
+    base = request.args.get('base', 'PEK').upper()
+    quote = request.args.get('quote', 'SWAP.HIVE').upper()
+    if (base, quote) not in SUPPORTED_PAIRS:
+        return jsonify({'error': f'Unsupported pair {base}/{quote}'}), 400
+    feed = get_pair_feed(base, quote)
+    try:
+        sub = feed.subscribe()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    def generate():
+        try:
+            while True:
+                try:
+                    event = sub.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    if sub.dropped:
+                        break  # Fell behind; client reconnects for a new snapshot
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            feed.unsubscribe(sub)
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+INSERT_ORDER_SQL = '''INSERT INTO orders (username, base, quote, amount, price, side) VALUES (?, ?, ?, ?, ?, ?)'''
+MAX_BATCH_ORDERS = int(os.environ.get('MAX_BATCH_ORDERS', '500'))
+
+def parse_order(data):
+    """Validate one order request; returns (order, None) or (None, error message)"""
+    if not isinstance(data, dict):
+        return None, 'order must be a JSON object'
+    base = str(data.get('base', 'PEK')).upper()
+    quote = str(data.get('quote', 'SWAP.HIVE')).upper()
     # Use mapped account for quote asset, fallback to default
     username = PAIR_ACCOUNT_MAP.get(quote, DEFAULT_ACCOUNT)
-    amount = str(data.get('amount'))
-    price = str(data.get('price'))
-    side = data.get('side', 'sell').lower()  # 'buy' or 'sell'
-    # Store order in DB
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''INSERT INTO orders (username, base, quote, amount, price, side) VALUES (?, ?, ?, ?, ?, ?)''',
-              (username, base, quote, amount, price, side))
-    conn.commit()
-    order_id = c.lastrowid
-    conn.close()
-    custom_json = {
+    side = str(data.get('side', 'sell')).lower()  # 'buy' or 'sell'
+    try:
+        amount_units = to_units(data.get('amount'), base)
+        price_units = to_units(data.get('price'), quote)
+    except ValueError:
+        return None, 'amount and price must be non-negative numbers'
+    if amount_units <= 0 or price_units <= 0:
+        return None, 'amount and price must be greater than zero'
+    if side not in ('buy', 'sell'):
+        return None, "side must be 'buy' or 'sell'"
+    return {
+        'username': username,
+        'base': base,
+        'quote': quote,
+        'side': side,
+        'amount_units': amount_units,
+        'price_units': price_units,
+    }, None
+
+def order_insert_params(order):
+    return (order['username'], order['base'], order['quote'], order['amount_units'], order['price_units'], order['side'])
+
+def order_custom_json(order):
+    return {
         "contractName": "market",
-        "contractAction": side,
+        "contractAction": order['side'],
         "contractPayload": {
-            "symbol": base,
-            "quantity": amount,
-            "price": price
+            "symbol": order['base'],
+            "quantity": from_units(order['amount_units'], order['base']),
+            "price": from_units(order['price_units'], order['quote'])
         }
     }
-    # Trigger FTP upload after 30 seconds
-    delayed_ftp_upload(30)
-    return jsonify({"order_id": order_id, "custom_json": custom_json, "used_account": username})
 
-@app.route('/api/orders')
+@api.route('/api/order', methods=['POST'])
+def api_order():
+    order, error = parse_order(request.json)
+    if error:
+        return jsonify({'error': error}), 400
+    busy = backup_backpressure()
+    if busy:
+        return busy
+    # Store order in DB
+    try:
+        order_id = order_writer.execute(INSERT_ORDER_SQL, order_insert_params(order), timeout=ORDER_WRITE_TIMEOUT)
+    except FutureTimeoutError:
+        # Withdrawn before it was written, so a retry cannot duplicate it
+        return jsonify({'error': 'Order store is busy; try again'}), 503, {'Retry-After': '1'}
+    # The leader's order tailer rests it in the book and wakes the matcher
+    order_tail_wakeup.set()
+    return jsonify({"order_id": order_id, "custom_json": order_custom_json(order), "used_account": order['username']})
+
+@api.route('/api/orders/batch', methods=['POST'])
+def api_orders_batch():
+    """Place many orders at once: all are validated first, then inserted in one transaction"""
+    data = request.get_json(silent=True)
+    items = data.get('orders') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'orders must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_ORDERS:
+        return jsonify({'error': f'at most {MAX_BATCH_ORDERS} orders per batch'}), 400
+    orders, errors = [], []
+    for index, item in enumerate(items):
+        order, error = parse_order(item)
+        if error:
+            errors.append({'index': index, 'error': error})
+        orders.append(order)
+    if errors:
+        # Nothing is stored unless every order is valid
+        return jsonify({'error': 'invalid orders in batch', 'errors': errors}), 400
+    busy = backup_backpressure()
+    if busy:
+        return busy
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        order_ids = []
+        for order in orders:
+            c.execute(INSERT_ORDER_SQL, order_insert_params(order))
+            order_ids.append(c.lastrowid)
+        conn.commit()
+    # One wakeup: the tailer adds the whole batch to the books and runs each touched pair's matcher once
+    order_tail_wakeup.set()
+    used_accounts = sorted({order['username'] for order in orders})
+    return jsonify({
+        "order_ids": order_ids,
+        # One custom_json op per order, in request order; with a single used
+        # account they can all go in one Hive transaction
+        "custom_json": [order_custom_json(order) for order in orders],
+        "used_accounts": used_accounts,
+        "orders": [{"order_id": order_id, "used_account": order['username']} for order_id, order in zip(order_ids, orders)],
+    })
+
+ORDERS_PAGE_SIZE = 100
+MAX_ORDERS_PAGE = 1000
+
+def query_orders(filters, after_id=None, limit=ORDERS_PAGE_SIZE, descending=True):
+    """One keyset page of orders matching `filters` (column -> value), ordered by id"""
+    where = [f'{column} = ?' for column in filters]
+    params = list(filters.values())
+    if after_id is not None:
+        where.append('id < ?' if descending else 'id > ?')
+        params.append(after_id)
+    sql = 'SELECT * FROM orders'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f" ORDER BY id {'DESC' if descending else 'ASC'} LIMIT ?"
+    params.append(limit)
+    with db.connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def orders_version():
+    """Last order_journal sequence number; the journal triggers bump it on every orders change"""
+    with db.connection() as conn:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='order_journal'").fetchone()
+    return row[0] if row else 0
+
+@api.route('/api/orders')
 def list_orders():
-    username = request.args.get('username')
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    if username:
-        c.execute('SELECT * FROM orders WHERE username = ? ORDER BY created_at DESC', (username,))
-    else:
-        c.execute('SELECT * FROM orders ORDER BY created_at DESC')
-    rows = c.fetchall()
-    conn.close()
-    orders = [
-        {
-            'id': row[0],
-            'username': row[1],
-            'base': row[2],
-            'quote': row[3],
-            'amount': row[4],
-            'price': row[5],
-            'side': row[6],
-            'status': row[7],
-            'created_at': row[8]
-        } for row in rows
-    ]
-    return jsonify({'orders': orders})
+    filters = {}
+    for column in ('username', 'base', 'quote', 'side', 'status'):
+        value = request.args.get(column)
+        if value:
+            filters[column] = value.upper() if column in ('base', 'quote') else value
+    if filters.get('side') not in (None, 'buy', 'sell'):
+        return jsonify({'error': "side must be 'buy' or 'sell'"}), 400
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': "order must be 'asc' or 'desc'"}), 400
+    descending = order == 'desc'
+    after_id = request.args.get('after_id', type=int)
+    limit = max(1, min(request.args.get('limit', ORDERS_PAGE_SIZE, type=int), MAX_ORDERS_PAGE))
+
+    if request.args.get('format') == 'ndjson':
+        # Export everything that matches, one page in memory at a time
+        def generate(cursor):
+            while True:
+                rows = query_orders(filters, cursor, MAX_ORDERS_PAGE, descending)
+                for row in rows:
+                    yield json.dumps(order_row_to_dict(row)) + '\n'
+                if len(rows) < MAX_ORDERS_PAGE:
+                    return
+                cursor = rows[-1][0]
+        return Response(generate(after_id), mimetype='application/x-ndjson')
+
+    def build():
+        rows = query_orders(filters, after_id, limit, descending)
+        next_after_id = rows[-1][0] if len(rows) == limit else None
+        return {'orders': [order_row_to_dict(row) for row in rows], 'next_after_id': next_after_id}
+    key = ('orders', tuple(sorted(filters.items())), after_id, limit, descending)
+    payload = payload_memo.get(key, orders_version(), build)
+    # Per-account data: browsers revalidate every time, and a 304 skips the body
+    return respond(payload, 'private, no-cache')
+
+def _decimal(value):
+    try:
+        return Decimal(str(value)) if value is not None else None
+    except InvalidOperation:
+        return None
+
+SUMMARY_TRADES_PAGE = 1000
+# Past this many 24h trades a pair's volume is reported as truncated
+SUMMARY_MAX_TRADES = int(os.environ.get('SUMMARY_MAX_TRADES', '50000'))
+
+def _remaining_trades(symbol, since, before_id):
+    """24h trades older than before_id, newest first, for a pair whose first page was full"""
+    query = {"symbol": symbol, "timestamp": {"$gte": since}, "_id": {"$lt": before_id}}
+    return hive_engine.find_all('market', 'trades', query, page_size=SUMMARY_TRADES_PAGE,
+                                max_rows=SUMMARY_MAX_TRADES - SUMMARY_TRADES_PAGE,
+                                indexes=[{"index": "_id", "descending": True}])
+
+def build_market_summary():
+    """One JSON-RPC batch for every supported pair: book top, 24h trades and metrics.
 
-@app.route('/api/price')
+    Busy pairs page through the rest of their 24h trades with follow-up finds.
+    """
+    since = int(time.time()) - 24 * 3600
+    calls = []
+    for base, quote in SUPPORTED_PAIRS:
+        symbol = f"{base}:{quote}"
+        calls.append(("getOrderBook", {"symbol": symbol, "limit": 1}))
+        calls.append(("find", {
+            "contract": "market",
+            "table": "trades",
+            "query": {"symbol": symbol, "timestamp": {"$gte": since}},
+            "limit": SUMMARY_TRADES_PAGE,
+            "indexes": [{"index": "_id", "descending": True}]
+        }))
+    bases = sorted({base for base, _ in SUPPORTED_PAIRS})
+    calls.append(("find", {
+        "contract": "market",
+        "table": "metrics",
+        "query": {"symbol": {"$in": bases}},
+        "limit": len(bases)
+    }))
+    results = hive_engine.batch(calls)
+    # market.metrics is denominated in SWAP.HIVE, so it only backs SWAP.HIVE pairs
+    metrics = {m.get('symbol'): m for m in (results[-1] or [])}
+    markets = []
+    for i, (base, quote) in enumerate(SUPPORTED_PAIRS):
+        book = results[2 * i] or {}
+        trades = results[2 * i + 1] or []
+        if len(trades) == SUMMARY_TRADES_PAGE:
+            trades = trades + _remaining_trades(f"{base}:{quote}", since, trades[-1]['_id'])
+        asks = book.get('asks') or []
+        bids = book.get('bids') or []
+        best_ask = _decimal(asks[0].get('price')) if asks else None
+        best_bid = _decimal(bids[0].get('price')) if bids else None
+        last_price = _decimal(trades[0].get('price')) if trades else None
+        volume = sum((_decimal(t.get('quantity')) or Decimal(0) for t in trades), Decimal(0))
+        metric = metrics.get(base) if quote == 'SWAP.HIVE' else None
+        if last_price is None and metric:
+            last_price = _decimal(metric.get('lastPrice'))
+        spread = best_ask - best_bid if best_ask is not None and best_bid is not None else None
+        markets.append({
+            'base': base,
+            'quote': quote,
+            'best_bid': str(best_bid) if best_bid is not None else None,
+            'best_ask': str(best_ask) if best_ask is not None else None,
+            'last_price': str(last_price) if last_price is not None else None,
+            'volume_24h': str(volume),
+            'volume_24h_truncated': len(trades) >= SUMMARY_MAX_TRADES,
+            'quote_volume_24h': metric.get('volume') if metric else None,
+            'spread': str(spread) if spread is not None else None,
+        })
+    return {'markets': markets, 'updated_at': int(time.time())}
+
+@api.route('/api/markets/summary')
+def api_markets_summary():
+    try:
+        return jsonify(market_cache.get(('markets.summary', None, None, None), build_market_summary))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/price')
 def api_price():
     base = request.args.get('base', 'PEK').upper()
     quote = request.args.get('quote', 'SWAP.HIVE').upper()
-    
-    # Get price from Hive Engine API
+    # Served from the market.metrics snapshot; other quotes are priced via SWAP.HIVE
     try:
-        payload = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "getOrderBook",
-            "params": {
-                "symbol": f"{base}:{quote}",
-                "limit": 1
-            }
-        }
-        
-        response = requests.post(HIVE_ENGINE_MARKET_API, json=payload, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            result = data.get('result')
-            
-            if result and 'asks' in result and len(result['asks']) > 0:
-                price = float(result['asks'][0]['price'])
-                return jsonify({'base': base, 'quote': quote, 'price': str(price)})
-            elif result and 'bids' in result and len(result['bids']) > 0:
-                price = float(result['bids'][0]['price'])
-                return jsonify({'base': base, 'quote': quote, 'price': str(price)})
-        
-        # Fallback price
-        return jsonify({'base': base, 'quote': quote, 'price': '0.001'})
-        
-    except Exception as e:
-        return jsonify({'error': f'Could not fetch price for {base}/{quote}: {str(e)}'}), 400
+        result = price_engine.price(base, quote)
+    except StalePriceError as e:
+        return jsonify({'error': f'Could not fetch price for {base}/{quote}: {e}'}), 503
+    if result is None:
+        return jsonify({'error': f'No price data for {base}/{quote}'}), 404
+    return jsonify(result)
 
-@app.route('/api/validate_account', methods=['POST'])
+@api.route('/api/validate_account', methods=['POST'])
 def api_validate_account():
     data = request.json
     username = data.get('username', '').strip()
@@ -298,7 +744,10 @@ def api_validate_account():
     except Exception as e:
         return jsonify({'error': f'Validation failed: {str(e)}'}), 500
 
-@app.route('/api/balance')
+# Shared pool for fanning out independent upstream reads
+balance_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('BALANCE_WORKERS', '8')))
+
+@api.route('/api/balance')
 def api_get_balance():
     username = request.args.get('username', '').strip()
     
@@ -306,44 +755,29 @@ def api_get_balance():
         return jsonify({'error': 'Username required'}), 400
     
     try:
+        # The Hive account (existence and HIVE balance in one cached lookup) and
+        # the Hive Engine tokens are fetched concurrently
+        hive_balance = balance_executor.submit(hive_chain.get_hive_balance, username)
+        he_balances = balance_executor.submit(hive_engine.find, 'tokens', 'balances', {"account": username}, limit=1000)
+        
         # Validate account exists
-        if not validate_hive_account(username):
+        try:
+            hive = hive_balance.result()
+        except ValueError:
             return jsonify({'error': 'Invalid Hive account'}), 400
         
-        # Initialize Hive connection
-        hive = Hive()
-        account = Account(username, blockchain_instance=hive)
-        
         balances = {}
         
-        # Get HIVE balance
-        hive_balance = account.get_balance()
-        balances['HIVE'] = str(hive_balance['HIVE'])
+        # HIVE balance from the Hive node
+        balances['HIVE'] = f"{hive:.3f}"
         
         # Get Hive Engine tokens
         try:
-            # Make request to Hive Engine API
-            he_url = f"https://api.hive-engine.com/rpc/contracts"
-            he_data = {
-                "jsonrpc": "2.0",
-                "method": "find",
-                "params": {
-                    "contract": "tokens",
-                    "table": "balances",
-                    "query": {"account": username},
-                    "limit": 1000
-                },
-                "id": 1
-            }
-            
-            response = requests.post(he_url, json=he_data)
-            if response.status_code == 200:
-                he_balances = response.json().get('result', [])
-                for token in he_balances:
-                    symbol = token.get('symbol')
-                    balance = token.get('balance', '0')
-                    if symbol in ['PEK', 'SWAP.HIVE', 'SWAP.BTC', 'SWAP.LTC', 'SWAP.ETH', 'SWAP.DOGE']:
-                        balances[symbol] = balance
+            for token in he_balances.result():
+                symbol = token.get('symbol')
+                balance = token.get('balance', '0')
+                if symbol in ['PEK', 'SWAP.HIVE', 'SWAP.BTC', 'SWAP.LTC', 'SWAP.ETH', 'SWAP.DOGE']:
+                    balances[symbol] = balance
         except Exception as e:
             print(f"Error fetching Hive Engine balances: {e}")
         
@@ -358,9 +792,35 @@ def api_get_balance():
     except Exception as e:
         return jsonify({'error': f'Failed to fetch balances: {str(e)}'}), 500
 
+MAX_BALANCE_ACCOUNTS = 100
+
+@api.route('/api/balances')
+def api_get_balances():
+    """Hive Engine token balances for many accounts in one upstream find.
+
+    Defaults to the liquidity accounts in PAIR_ACCOUNT_MAP.
+    """
+    usernames = request.args.get('usernames')
+    if usernames:
+        accounts = sorted({u.strip().lower() for u in usernames.split(',') if u.strip()})
+    else:
+        accounts = sorted(set(PAIR_ACCOUNT_MAP.values()) | {DEFAULT_ACCOUNT})
+    if len(accounts) > MAX_BALANCE_ACCOUNTS:
+        return jsonify({'error': f'At most {MAX_BALANCE_ACCOUNTS} usernames per request'}), 400
+    try:
+        rows = hive_engine.find_all('tokens', 'balances', {"account": {"$in": accounts}})
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch balances: {str(e)}'}), 500
+    balances = {account: {} for account in accounts}
+    for row in rows:
+        account = row.get('account')
+        if account in balances:
+            balances[account][row.get('symbol')] = row.get('balance', '0')
+    return jsonify({'balances': balances})
+
 # API endpoints for FTP management
 
-@app.route('/api/ftp/config', methods=['POST'])
+@api.route('/api/ftp/config', methods=['POST'])
 def api_save_ftp_config():
     data = request.json
     required = ['host', 'user', 'password']
@@ -369,19 +829,19 @@ def api_save_ftp_config():
     save_ftp_config({k: data[k] for k in required})
     return jsonify({'success': True})
 
-@app.route('/api/ftp/config', methods=['GET'])
+@api.route('/api/ftp/config', methods=['GET'])
 def api_get_ftp_config():
     config = load_ftp_config()
     if not config:
         return jsonify({'error': 'No FTP config set.'}), 404
     return jsonify({'host': config['host'], 'user': config['user']})
 
-@app.route('/api/ftp/config', methods=['DELETE'])
+@api.route('/api/ftp/config', methods=['DELETE'])
 def api_erase_ftp_config():
     erase_ftp_config()
     return jsonify({'success': True})
 
-@app.route('/api/ftp/upload', methods=['POST'])
+@api.route('/api/ftp/upload', methods=['POST'])
 def api_ftp_upload():
     ok, msg = upload_orders_to_ftp()
     if ok:
@@ -389,7 +849,85 @@ def api_ftp_upload():
     else:
         return jsonify({'error': msg}), 500
 
-@app.route('/api/ftp/download', methods=['GET'])
+# Scrape-time metrics derived from state the app already keeps
+def _cache_samples(kind):
+    for name, cache in (('market', market_cache), ('accounts', hive_chain.accounts), ('payloads', payload_memo)):
+        stats = cache.stats()
+        if kind == 'requests':
+            for result in ('hits', 'stale_hits', 'misses'):
+                yield (name, result), stats[result]
+        elif kind == 'ratio':
+            total = stats['hits'] + stats['stale_hits'] + stats['misses']
+            yield (name,), (stats['hits'] + stats['stale_hits']) / total if total else None
+        else:
+            yield (name,), stats['entries']
+
+metrics.callback('peakedex_cache_requests_total', 'Cache lookups by result',
+                 lambda: _cache_samples('requests'), ('cache', 'result'), kind='counter')
+metrics.callback('peakedex_cache_hit_ratio', 'Share of cache lookups served from cache (fresh or stale)',
+                 lambda: _cache_samples('ratio'), ('cache',))
+metrics.callback('peakedex_cache_entries', 'Entries held by each cache',
+                 lambda: _cache_samples('entries'), ('cache',))
+def _book_depth_samples():
+    for (base, quote), book in list(ORDER_BOOKS.items()):
+        with book.lock:
+            counts = [(side, book.count(side)) for side in ('buy', 'sell')]
+        for side, count in counts:
+            yield (base, quote, side), count
+
+metrics.callback('peakedex_orderbook_pending_orders', 'Resting orders in the in-memory book',
+                 _book_depth_samples, ('base', 'quote', 'side'))
+metrics.callback('peakedex_ftp_backup_lag_seconds', 'Age of the oldest order change not yet in the FTP backup',
+                 lambda: [((), replicator.status()['lag_seconds'])])
+metrics.callback('peakedex_ftp_backup_backlog', 'Order changes not yet in the FTP backup',
+                 lambda: [((), order_journal.backlog())])
+metrics.callback('peakedex_ftp_upload_failures_total', 'Failed FTP backup uploads',
+                 lambda: [((), replicator.failures)], kind='counter')
+metrics.callback('peakedex_price_snapshot_age_seconds', 'Age of the market.metrics price snapshot',
+                 lambda: [((), price_engine.age())] if price_engine.age() is not None else [])
+metrics.callback('peakedex_startup_seconds', 'Seconds from process start to each startup phase',
+                 lambda: [((phase,), seconds) for phase, seconds in startup.status()['phases'].items()], ('phase',))
+metrics.callback('peakedex_ready', '1 once the background startup tasks have finished',
+                 lambda: [((), int(startup.ready()))])
+
+@api.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@api.route('/api/ready', methods=['GET'])
+def api_ready():
+    status = startup.status()
+    if leader.is_leader:
+        status['role'] = 'leader'
+    else:
+        status['role'] = 'web' if current_app.config['DEX_ROLE'] == 'web' else 'follower'
+    # Still ready (reads are served), but new orders are being refused
+    status['degraded'] = ['ftp_backup'] if backup_backlog_exceeded() is not None else []
+    return jsonify(status), 200 if status['ready'] else 503
+
+@api.route('/api/upstream/status', methods=['GET'])
+def api_upstream_status():
+    # Per-node latency, error rate and circuit state for Hive Engine and Hive
+    return jsonify({'hive_engine': hive_engine.nodes.status(), 'hive': hive_rpc.nodes.status()})
+
+@api.route('/api/price/status', methods=['GET'])
+def api_price_status():
+    return jsonify(price_engine.status())
+
+@api.route('/api/broadcast/status', methods=['GET'])
+def api_broadcast_status():
+    return jsonify(broadcasts.status())
+
+@api.route('/api/ftp/status', methods=['GET'])
+def api_ftp_status():
+    # The uploader counters are the leader's; the backlog is shared by every worker
+    status = replicator.status()
+    status['backlog'] = order_journal.backlog()
+    status['max_backlog'] = FTP_BACKUP_MAX_BACKLOG
+    status['degraded'] = bool(FTP_BACKUP_MAX_BACKLOG) and load_ftp_config() is not None and status['backlog'] > FTP_BACKUP_MAX_BACKLOG
+    return jsonify(status), 503 if status['degraded'] else 200
+
+@api.route('/api/ftp/download', methods=['GET'])
 def api_ftp_download():
     data, err = download_orders_from_ftp()
     if data:
@@ -397,7 +935,7 @@ def api_ftp_download():
     else:
         return jsonify({'error': err}), 500
 
-@app.route('/api/ftp/erase_orders', methods=['DELETE'])
+@api.route('/api/ftp/erase_orders', methods=['DELETE'])
 def api_ftp_erase_orders():
     ok, msg = erase_orders_on_ftp()
     if ok:
@@ -405,248 +943,285 @@ def api_ftp_erase_orders():
     else:
         return jsonify({'error': msg}), 500
 
-@app.route('/api/ftp/import', methods=['POST'])
+@api.route('/api/ftp/import', methods=['POST'])
 def api_ftp_import():
-    data, err = download_orders_from_ftp()
+    stats, err = import_orders_from_ftp(label='ftp import')
     if err:
         return jsonify({'error': err}), 500
-    if not data or 'orders' not in data:
+    if not stats['read']:
         return jsonify({'error': 'No orders found in FTP file.'}), 404
-    imported = 0
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    for order in data['orders']:
-        # Check if order already exists by id (if id is present and unique)
-        c.execute('SELECT 1 FROM orders WHERE id = ?', (order.get('id'),))
-        if c.fetchone():
-            continue  # Skip existing
-        c.execute('''INSERT INTO orders (username, base, quote, amount, price, side, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (
-                      order.get('username'),
-                      order.get('base'),
-                      order.get('quote'),
-                      order.get('amount'),
-                      order.get('price'),
-                      order.get('side'),
-                      order.get('status', 'pending'),
-                      order.get('created_at')
-                  ))
-        imported += 1
-    conn.commit()
-    conn.close()
-    return jsonify({'success': True, 'imported': imported})
+    return jsonify({'success': True, **stats})
 
 def restore_orders_from_ftp_on_startup():
-    data, err = download_orders_from_ftp()
-    if err or not data or 'orders' not in data:
-        return  # No FTP file or error, skip restore
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    for order in data['orders']:
-        c.execute('SELECT 1 FROM orders WHERE id = ?', (order.get('id'),))
-        if c.fetchone():
-            continue
-        c.execute('''INSERT INTO orders (username, base, quote, amount, price, side, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (
-                      order.get('username'),
-                      order.get('base'),
-                      order.get('quote'),
-                      order.get('amount'),
-                      order.get('price'),
-                      order.get('side'),
-                      order.get('status', 'pending'),
-                      order.get('created_at')
-                  ))
-    conn.commit()
-    conn.close()
-
-# Call restore on startup
-restore_orders_from_ftp_on_startup()
-
-# Set FTP config for Geocities
-save_ftp_config({
+    if not FTP_BACKUP_ENABLED:
+        return None
+    stats, err = import_orders_from_ftp(label='ftp restore')
+    if err:
+        raise Exception(err)
+    return stats
+
+# FTP config for Geocities, used until one is saved through /api/ftp/config
+DEFAULT_FTP_CONFIG = {
     'host': 'ftp.geocities.com',
     'user': 'peakecoin',
     'password': 'Peake410'
-})
+}
 
 # --- Hive Engine order matching and execution ---
 
-HIVE_NODE = "https://api.hive.blog"
 LIQUIDITY_ACCOUNT = "peakecoin.matic"
 # Store your active key securely! For demo, you can set as env var or config file
 LIQUIDITY_ACTIVE_KEY = os.environ.get("PEAKECOIN_MATIC_ACTIVE_KEY", "")
 
 def validate_hive_account(username):
-    """Validate if a Hive account exists using beem"""
+    """Validate if a Hive account exists (cached, including unknown names)"""
     try:
-        hive = Hive(node=HIVE_NODE)
-        account = Account(username, blockchain_instance=hive)
-        return account.exists()
-    except AccountDoesNotExistsException:
-        return False
+        return hive_chain.account_exists(username)
     except Exception as e:
         print(f"Error validating account {username}: {e}")
         return False
 
+# --- In-memory order books ---
+
+# Amounts and prices are integer units (see units.py), so a fill leaves no dust
+ORDER_BOOKS = {}
+_order_books_lock = threading.Lock()
+
+def get_order_book(base, quote):
+    book = ORDER_BOOKS.get((base, quote))
+    if book is None:
+        with _order_books_lock:
+            book = ORDER_BOOKS.setdefault((base, quote), OrderBook(base, quote))
+    return book
+
+def load_order_books():
+    """Rebuild the resident order books from pending rows in the orders table.
+    Returns the highest order id loaded, where the order tailer carries on."""
+    for base, quote in SUPPORTED_PAIRS:
+        get_order_book(base, quote)
+    with db.connection() as conn:
+        c = conn.cursor()
+        # One read transaction, so the books and last_id come from the same snapshot
+        c.execute('BEGIN')
+        last_id = c.execute('SELECT COALESCE(MAX(id), 0) FROM orders').fetchone()[0]
+        c.execute("SELECT DISTINCT base, quote FROM orders WHERE status='pending'")
+        pairs = c.fetchall()
+        for base, quote in pairs:
+            book = get_order_book(base, quote)
+            with book.lock:
+                _load_book_rows(c, book)
+    return last_id
+
+def _load_book_rows(c, book):
+    """Rest every pending order of the book's pair; the caller holds book.lock"""
+    for side, direction in (('buy', 'DESC'), ('sell', 'ASC')):
+        # Walks idx_orders_book in book order
+        c.execute(f"SELECT id, username, amount, price, created_at FROM orders WHERE base=? AND quote=? AND side=? AND status='pending' ORDER BY price {direction}, created_at ASC, id ASC",
+                  (book.base, book.quote, side))
+        for order_id, username, amount, price, created_at in c:
+            book.add(Order(order_id, username, side, price, amount, created_at))
+
+def reload_order_book(base, quote):
+    """Replace one pair's resident book with the pending rows in the table"""
+    book = get_order_book(base, quote)
+    with db.connection() as conn:
+        c = conn.cursor()
+        with book.lock:
+            book.clear()
+            _load_book_rows(c, book)
+
 # Match buy/sell orders and execute via mapped account
 
-def match_and_execute_orders():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Find all pairs
-    c.execute("SELECT DISTINCT base, quote FROM orders WHERE status='pending'")
-    pairs = c.fetchall()
-    for base, quote in pairs:
-        # Get all buy and sell orders for this pair, sorted by price/time
-        c.execute("SELECT * FROM orders WHERE base=? AND quote=? AND side='buy' AND status='pending' ORDER BY price DESC, created_at ASC", (base, quote))
-        buys = c.fetchall()
-        c.execute("SELECT * FROM orders WHERE base=? AND quote=? AND side='sell' AND status='pending' ORDER BY price ASC, created_at ASC", (base, quote))
-        sells = c.fetchall()
-        # Match orders
-        i, j = 0, 0
-        while i < len(buys) and j < len(sells):
-            buy = buys[i]
-            sell = sells[j]
-            buy_price = float(buy[5])
-            sell_price = float(sell[5])
-            if buy_price >= sell_price:
-                # Match found
-                trade_price = sell_price  # Favor earlier/lower price
-                trade_amount = min(float(buy[4]), float(sell[4]))
-                # Use mapped account for this quote asset
-                account = PAIR_ACCOUNT_MAP.get(quote, DEFAULT_ACCOUNT)
-                active_key = os.environ.get(f"PEAKECOIN_{account.split('.')[-1].upper()}_ACTIVE_KEY", "")
-                try:
-                    tx_id = execute_hive_engine_trade(base, quote, trade_amount, trade_price, account, active_key, "match")
-                except Exception as e:
-                    print(f"Trade execution failed: {e}")
-                    break
-                # Update orders in DB
-                c.execute("UPDATE orders SET amount=?, status='filled' WHERE id=?", (float(buy[4]) - trade_amount, buy[0]))
-                c.execute("UPDATE orders SET amount=?, status='filled' WHERE id=?", (float(sell[4]) - trade_amount, sell[0]))
-                conn.commit()
-                # If order not fully filled, keep it as pending with reduced amount
-                if float(buy[4]) - trade_amount > 0.00001:
-                    c.execute("UPDATE orders SET amount=?, status='pending' WHERE id=?", (float(buy[4]) - trade_amount, buy[0]))
-                if float(sell[4]) - trade_amount > 0.00001:
-                    c.execute("UPDATE orders SET amount=?, status='pending' WHERE id=?", (float(sell[4]) - trade_amount, sell[0]))
-                conn.commit()
-                i += 1
-                j += 1
-            else:
-                break
-    conn.close()
-
-def execute_hive_engine_trade(base, quote, amount, price, account, active_key, action_type="sell"):
-    symbol = f"{base}:{quote}"
-    print(f"[BEEM] Executing {amount} {symbol} at {price} as {account} (action: {action_type})")
-    
-    # 1. Try using beem to broadcast transaction
-    try:
-        if not active_key:
-            print(f"[BEEM] No active key provided for {account}")
-            raise Exception("No active key provided")
-            
-        # Initialize Hive connection with beem
-        hive = Hive(keys=[active_key], node=HIVE_NODE)
-        
-        # Determine action based on type
-        if action_type == "match":
-            # For matched orders, we need to execute both sides
-            action = "sell"  # Default to sell for now
-        else:
-            action = action_type
-        
-        # Create custom JSON for Hive Engine market transaction
-        custom_json = {
-            "contractName": "market",
-            "contractAction": action,
-            "contractPayload": {
-                "symbol": symbol,
-                "quantity": str(amount),
-                "price": str(price)
-            }
+def trade_custom_json(base, quote, amount, price):
+    return {
+        "contractName": "market",
+        "contractAction": "sell",
+        "contractPayload": {
+            "symbol": f"{base}:{quote}",
+            "quantity": amount,
+            "price": price
         }
-        
-        # Broadcast custom JSON transaction
-        result = hive.custom_json(
-            id="ssc-mainnet-hive",
-            json_data=custom_json,
-            required_auths=[account]
-        )
-        
-        if result and 'trx_id' in result:
-            print(f"[BEEM] Transaction successful: {result['trx_id']}")
-            return f"beem_success_{result['trx_id']}"
-        else:
-            print(f"[BEEM] Transaction failed or no trx_id returned")
-            
-    except Exception as e:
-        print(f"[BEEM] Exception: {e}. Falling back to API methods.")
-    
-    # 2. Fallback to hive-nectar API (direct broadcast)
+    }
+
+MATCH_DURATION = metrics.histogram('peakedex_match_cycle_duration_seconds',
+                                   'Duration of one match_and_execute_orders pass', ('base', 'quote'))
+MATCH_FILLS = metrics.counter('peakedex_match_fills_total', 'Fills produced by the matcher', ('base', 'quote'))
+
+def match_and_execute_orders(base, quote):
+    """Match crossing orders for one pair, persist the fills and queue their broadcasts"""
+    started = time.perf_counter()
     try:
-        print(f"[HIVE-NECTAR-API] Attempting direct API fallback for {symbol}")
-        hive_nectar_api_url = "https://api.hive-nectar.com/broadcast"  # Replace with your actual endpoint
-        custom_json = {
-            "contractName": "market",
-            "contractAction": action_type if action_type != "match" else "sell",
-            "contractPayload": {
-                "symbol": symbol,
-                "quantity": str(amount),
-                "price": str(price)
-            }
-        }
-        payload = {
-            "account": account,
-            "active_key": active_key,  # Only if your API is private/trusted!
-            "id": "ssc-mainnet-hive",
-            "json": json.dumps(custom_json)
-        }
-        r = requests.post(hive_nectar_api_url, json=payload, timeout=10)
-        if r.status_code == 200:
-            print(f"[HIVE-NECTAR-API] Order placed via hive-nectar API.")
-            return "hive_nectar_api_success"
-        else:
-            print(f"[HIVE-NECTAR-API] API error: {r.text}")
-    except Exception as e:
-        print(f"[HIVE-NECTAR-API] Exception: {e}. Falling back to Nectar Engine API.")
-    
-    # 3. Fallback to direct Nectar Engine API (if available)
+        _match_pair(base, quote)
+    finally:
+        MATCH_DURATION.observe(time.perf_counter() - started, base, quote)
+
+# Seconds before a pair whose match transaction failed is matched again
+MATCH_RETRY_DELAY = 1.0
+
+def _match_pair(base, quote):
+    book = get_order_book(base, quote)
+    # Use mapped account for this quote asset
+    account = PAIR_ACCOUNT_MAP.get(quote, DEFAULT_ACCOUNT)
     try:
-        print(f"[NECTARENGINE] Attempting direct API fallback for {symbol}")
-        nectar_api_url = "https://api.nectar.engine/market/order"  # Example endpoint
-        payload = {
-            "account": account,
-            "symbol": symbol,
-            "quantity": str(amount),
-            "price": str(price),
-            "side": action_type if action_type != "match" else "sell"
-        }
-        r = requests.post(nectar_api_url, json=payload, timeout=10)
-        if r.status_code == 200:
-            print(f"[NECTARENGINE] Order placed via Nectar Engine API.")
-            return "nectarengine_success"
-        else:
-            print(f"[NECTARENGINE] API error: {r.text}")
-    except Exception as e:
-        print(f"[NECTARENGINE] Exception: {e}")
-    
-    # For now, return success to allow testing
-    print(f"[PLACEHOLDER] Trade logged successfully")
-    return "placeholder_success"
+        fills = _match_book(book, account)
+    except Exception:
+        # The transaction rolled back but the book already holds its fills:
+        # rebuild the book from the table and try the pair again shortly
+        reload_order_book(base, quote)
+        threading.Timer(MATCH_RETRY_DELAY, request_match, (base, quote)).start()
+        raise
+    if fills:
+        MATCH_FILLS.inc(base, quote, amount=len(fills))
+        broadcasts.notify()
+        replicator.mark_dirty()
+        # No candle update here: each fill is broadcast as a Hive Engine market
+        # order, and its market.trades row reaches the candles through trade_sync
+
+def _match_book(book, account):
+    """Match the book until it no longer crosses and commit all fills in one transaction"""
+    base, quote = book.base, book.quote
+    fills = []
+    with db.connection() as conn:
+        c = conn.cursor()
+        with book.lock:
+            while True:
+                match = book.next_match()
+                if match is None:
+                    break
+                buy, sell, trade_price, trade_amount = match
+                book.apply_fill(buy, sell, trade_amount)
+                # Update orders in DB; partially filled orders stay pending with the reduced amount
+                for order in (buy, sell):
+                    status = 'filled' if order.amount <= 0 else 'pending'
+                    c.execute("UPDATE orders SET amount=?, status=? WHERE id=?", (order.amount, status, order.id))
+                # Broadcast happens off the matcher; a buy/sell pair fills at most once
+                amount, price = from_units(trade_amount, base), from_units(trade_price, quote)
+                broadcasts.enqueue(c, f"fill:{buy.id}:{sell.id}", account, trade_custom_json(base, quote, amount, price))
+                fills.append((price, amount))
+            conn.commit()
+    return fills
+
+# Background matcher thread, woken for a pair whenever an order is placed
+_match_queue = queue.Queue()
+_match_pending = set()
+_match_pending_lock = threading.Lock()
+
+def request_match(base, quote):
+    with _match_pending_lock:
+        if (base, quote) in _match_pending:
+            return
+        _match_pending.add((base, quote))
+    _match_queue.put((base, quote))
 
-# Background thread to run the matcher every 10 seconds
 def start_matcher_thread():
     def run():
         while True:
-            match_and_execute_orders()
-            time.sleep(10)
+            base, quote = _match_queue.get()
+            with _match_pending_lock:
+                _match_pending.discard((base, quote))
+            try:
+                match_and_execute_orders(base, quote)
+            except Exception as e:
+                print(f"Matcher error for {base}/{quote}: {e}")
     threading.Thread(target=run, daemon=True).start()
+    # Orders restored from the database may already cross
+    for base, quote in list(ORDER_BOOKS):
+        request_match(base, quote)
+
+# Orders may be inserted by any worker process; the leader picks them up from
+# the table and rests them in its books. /api/order wakes it straight away.
+ORDER_TAIL_INTERVAL = float(os.environ.get('ORDER_TAIL_INTERVAL', '0.2'))
+order_tail_wakeup = threading.Event()
+
+def tail_new_orders(last_id):
+    """Add orders with id > last_id to the books and wake the matcher; returns the new last id"""
+    with db.connection() as conn:
+        rows = conn.execute("SELECT id, username, base, quote, side, amount, price, created_at, status FROM orders WHERE id > ? ORDER BY id",
+                            (last_id,)).fetchall()
+        reloads = conn.execute('SELECT base, quote FROM book_reloads').fetchall()
+        if reloads:
+            conn.executemany('DELETE FROM book_reloads WHERE base = ? AND quote = ?', reloads)
+            conn.commit()
+    touched = set()
+    for base, quote in reloads:
+        reload_order_book(base, quote)
+        touched.add((base, quote))
+    for order_id, username, base, quote, side, amount, price, created_at, status in rows:
+        last_id = order_id
+        if status != 'pending':
+            continue
+        book = get_order_book(base, quote)
+        with book.lock:
+            book.add(Order(order_id, username, side, price, amount, created_at))
+        touched.add((base, quote))
+    for base, quote in touched:
+        request_match(base, quote)
+    if rows:
+        # Schedule a (coalesced) FTP backup
+        replicator.mark_dirty()
+    return last_id
+
+def start_order_tailer(last_id):
+    def run():
+        nonlocal last_id
+        while True:
+            order_tail_wakeup.wait(ORDER_TAIL_INTERVAL)
+            order_tail_wakeup.clear()
+            try:
+                last_id = tail_new_orders(last_id)
+            except Exception as e:
+                print(f"Order tailer error: {e}")
+    threading.Thread(target=run, daemon=True).start()
+
+# Keep the local trade history in sync with Hive Engine
+# and fold new trades into the candles (catching up on any the candles missed)
+trade_sync = TradeSync(trade_store, hive_engine, SUPPORTED_PAIRS, interval=TRADE_SYNC_INTERVAL,
+                       on_trades=candles.add_upstream_trades)
+
+LEADER_STARTUP_TASKS = ('ftp_restore', 'order_books', 'candles_catch_up')
+
+def run_leader_startup():
+    # The restore goes first so restored orders are in the books; orders
+    # placed meanwhile are in the table and picked up by the tailer
+    startup.run('ftp_restore', restore_orders_from_ftp_on_startup)
+    if FTP_BACKUP_ENABLED and load_ftp_config() is None:
+        save_ftp_config(DEFAULT_FTP_CONFIG)
+    last_id = startup.run('order_books', load_order_books) or 0
+    start_matcher_thread()
+    start_order_tailer(last_id)
+    broadcasts.start()
+    if FTP_BACKUP_ENABLED:
+        replicator.start()
+    startup.run('candles_catch_up', candles.catch_up, trade_store, SUPPORTED_PAIRS)
+    trade_sync.start()
+    startup.mark('leader_ready')
+
+def start_leader_services():
+    """Everything that must run in exactly one process: restore, matching, broadcasting, backup, trade sync.
+    Runs in the background; HTTP is served meanwhile and /api/ready reports progress."""
+    startup.expect(*LEADER_STARTUP_TASKS)
+    threading.Thread(target=run_leader_startup, daemon=True).start()
+
+# Worker role: 'auto' competes for leadership (and takes over if the leader dies),
+# 'web' only serves HTTP and never runs the background services
+DEX_ROLE = os.environ.get('DEX_ROLE', 'auto')
+leader = LeaderElection(os.environ.get('LEADER_LOCK_PATH', f'{DB_PATH}.leader'),
+                        retry_interval=float(os.environ.get('LEADER_RETRY_INTERVAL', '5')))
+
+def create_app(role=None):
+    """Build the Flask app. Safe to call in every worker process: the schema setup
+    is idempotent and only the elected leader starts the background services."""
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(api)
+    app.config['DEX_ROLE'] = role = role or DEX_ROLE
+    init_db()
+    if role != 'web':
+        leader.start(start_leader_services)
+    startup.mark('app_created')
+    return app
 
-# Start matcher on startup
-start_matcher_thread()
+startup.mark('imported')
 
 if __name__ == '__main__':
     print("Starting PEK Dex Backend...")
@@ -659,4 +1234,4 @@ if __name__ == '__main__':
     print("  GET  /api/orders")
     print("  GET  /api/price")
     print("  POST /api/validate_account")
-    app.run(host='0.0.0.0', port=8080)
+    create_app().run(host='0.0.0.0', port=8080)
@@ -0,0 +1 @@
+# Benchmark suite; run with: python -m bench.run --help
@@ -0,0 +1,185 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Hive Engine contracts API (and the few Hive
+# condenser_api reads the app makes), with configurable latency.
+# Data is generated from a fixed seed so runs are comparable.
+#
+# Supported JSON-RPC methods (single requests and batches):
+#   getOrderBook {symbol, limit}
+#   find market.trades   {symbol, _id: {$gt}} with limit/offset
+#   find market.metrics  {} | {symbol} | {symbol: {$in}}
+#   find tokens.balances {account | account: {$in: [...]}}
+#   condenser_api.get_accounts [[name, ...]]
+
+
+class FakeHiveEngine:
+    def __init__(self, latency=0.0, jitter=0.0, trades_per_pair=2000, book_levels=200, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.trades_per_pair = trades_per_pair
+        self.book_levels = book_levels
+        self.seed = seed
+        self.calls = 0
+        self._books = {}
+        self._trades = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    # --- generated data ---
+
+    def _rng(self, symbol):
+        return random.Random(f'{self.seed}:{symbol}')
+
+    def order_book(self, symbol):
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                rng = self._rng(symbol)
+                mid = 1.0
+                token = symbol.split(':')[0]
+
+                def order(side, i):
+                    # A few orders per price level, with the fields Hive Engine returns
+                    offset = (i // 4 + 1) * 0.001
+                    quantity = rng.uniform(1, 500)
+                    return {'_id': i, 'txId': f'{rng.getrandbits(160):040x}', 'timestamp': 1_700_000_000 + i,
+                            'account': f'{side}er{i}', 'symbol': token,
+                            'price': f'{mid - offset if side == "buy" else mid + offset:.8f}',
+                            'quantity': f'{quantity:.8f}', 'tokensLocked': f'{quantity * mid:.8f}',
+                            'expiration': 1_702_592_000 + i}
+                book = {
+                    'bids': [order('buy', i) for i in range(self.book_levels)],
+                    'asks': [order('sell', i) for i in range(self.book_levels)],
+                }
+                self._books[symbol] = book
+            return book
+
+    def trades(self, symbol):
+        with self._lock:
+            trades = self._trades.get(symbol)
+            if trades is None:
+                rng = self._rng(symbol)
+                start = 1_700_000_000
+                trades = [{'_id': i, 'symbol': symbol, 'type': rng.choice(['buy', 'sell']),
+                           'price': f'{rng.uniform(0.9, 1.1):.8f}', 'quantity': f'{rng.uniform(1, 100):.8f}',
+                           'timestamp': start + i * 30}
+                          for i in range(1, self.trades_per_pair + 1)]
+                self._trades[symbol] = trades
+            return trades
+
+    def metrics(self):
+        # One row per token, priced in SWAP.HIVE
+        rows = []
+        for symbol, price in (('PEK', 1.0), ('PIMP', 0.05), ('SWAP.BTC', 250000.0), ('SWAP.ETH', 9000.0),
+                              ('SWAP.LTC', 300.0), ('SWAP.DOGE', 0.6), ('SWAP.MATIC', 2.0), ('SWAP.HBD', 4.0)):
+            rows.append({'symbol': symbol, 'lastPrice': f'{price:.8f}', 'highestBid': f'{price * 0.99:.8f}',
+                         'lowestAsk': f'{price * 1.01:.8f}', 'volume': '1234.5'})
+        return rows
+
+    def _find(self, params):
+        contract, table = params.get('contract'), params.get('table')
+        query = params.get('query') or {}
+        limit, offset = params.get('limit', 1000), params.get('offset', 0)
+        if (contract, table) == ('market', 'trades'):
+            rows = self.trades(query.get('symbol', 'PEK:SWAP.HIVE'))
+            after = (query.get('_id') or {}).get('$gt')
+            if after is not None:
+                rows = [t for t in rows if t['_id'] > after]
+            indexes = params.get('indexes') or []
+            if indexes and indexes[0].get('descending'):
+                rows = rows[::-1]
+            return rows[offset:offset + limit]
+        if (contract, table) == ('market', 'metrics'):
+            rows = self.metrics()
+            symbol = query.get('symbol')
+            if isinstance(symbol, dict):
+                rows = [m for m in rows if m['symbol'] in symbol.get('$in', [])]
+            elif symbol is not None:
+                rows = [m for m in rows if m['symbol'] == symbol]
+            return rows[offset:offset + limit]
+        if (contract, table) == ('tokens', 'balances'):
+            account = query.get('account')
+            accounts = account.get('$in', []) if isinstance(account, dict) else [account]
+            rows = [{'account': name, 'symbol': symbol, 'balance': f'{self._rng(name + symbol).uniform(0, 1000):.8f}'}
+                    for name in accounts for symbol in ('PEK', 'SWAP.HIVE', 'SWAP.BTC')]
+            return rows[offset:offset + limit]
+        return []
+
+    def handle(self, request):
+        method, params = request.get('method'), request.get('params')
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        if method == 'getOrderBook':
+            book = self.order_book(params['symbol'])
+            limit = params.get('limit', 50)
+            response['result'] = {'bids': book['bids'][:limit], 'asks': book['asks'][:limit]}
+        elif method == 'find':
+            response['result'] = self._find(params)
+        elif method == 'findOne':
+            rows = self._find(dict(params, limit=1))
+            response['result'] = rows[0] if rows else None
+        elif method == 'condenser_api.get_accounts':
+            response['result'] = [{'name': name, 'balance': '100.000 HIVE'} for name in params[0]]
+        else:
+            response['error'] = {'code': -32601, 'message': f'Method not found: {method}'}
+        return response
+
+    # --- HTTP server ---
+
+    def start(self, host='127.0.0.1', port=0):
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+                engine.calls += 1
+                delay = engine.latency + random.uniform(0, engine.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                if isinstance(body, list):
+                    result = [engine.handle(item) for item in body]
+                else:
+                    result = engine.handle(body or {})
+                data = json.dumps(result).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the fake Hive Engine JSON-RPC server')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random delay, up to this many seconds')
+    args = parser.parse_args()
+    fake = FakeHiveEngine(latency=args.latency, jitter=args.jitter)
+    print(f"Fake Hive Engine listening on {fake.start(port=args.port)}")
+    threading.Event().wait()
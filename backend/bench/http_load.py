@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# HTTP load scenarios against a running backend.
+# Each scenario sends `requests` calls from `concurrency` client threads (one
+# keep-alive session per thread) and reports throughput and latency
+# percentiles. Any non-2xx response counts as an error.
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_scenario(name, send, total, concurrency):
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = send(session, i).ok
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'name': name,
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'requests_per_sec': round(total / seconds, 1),
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)),
+            'p50': ms(_percentile(latencies, 0.50)),
+            'p90': ms(_percentile(latencies, 0.90)),
+            'p99': ms(_percentile(latencies, 0.99)),
+            'max': ms(latencies[-1]),
+        },
+    }
+
+
+def run(base_url, total=2000, concurrency=16):
+    """order insert, then order book and order listing reads"""
+    quotes = ['SWAP.HIVE', 'SWAP.BTC', 'SWAP.HBD']
+
+    def place_order(session, i):
+        # Bids below 0.5 and asks above it never cross, so this measures the insert path only
+        side = 'buy' if i % 2 else 'sell'
+        price = 0.4 + (i % 97) / 1000 if side == 'buy' else 0.6 - (i % 97) / 1000
+        return session.post(f'{base_url}/api/order', json={
+            'base': 'PEK', 'quote': quotes[i % len(quotes)], 'side': side,
+            'amount': 1 + i % 10, 'price': round(price, 8)})
+
+    def order_book(session, i):
+        return session.get(f'{base_url}/api/orderbook', params={'base': 'PEK', 'quote': quotes[i % len(quotes)]})
+
+    def order_book_compact(session, i):
+        return session.get(f'{base_url}/api/orderbook', params={'base': 'PEK', 'quote': quotes[i % len(quotes)],
+                                                               'format': 'compact', 'depth': 20})
+
+    def list_orders(session, i):
+        return session.get(f'{base_url}/api/orders', params={'limit': 100, 'quote': quotes[i % len(quotes)]})
+
+    results = []
+    for name, send in (('post_order', place_order), ('get_orderbook', order_book),
+                       ('get_orderbook_compact', order_book_compact), ('get_orders', list_orders)):
+        print(f"[bench] {name}: {total} requests x {concurrency} clients...")
+        results.append(run_scenario(name, send, total, concurrency))
+    return results
@@ -0,0 +1,97 @@
+import gc
+import random
+import time
+
+from orderbook import Order, OrderBook
+
+# Microbenchmarks for the in-memory order book behind match_and_execute_orders.
+# For each size a book is filled with that many resting, non-crossing orders,
+# then the timings below are taken:
+#   build       add() every order
+#   best_price  best_bid() + best_ask()
+#   sweep       an aggressive order filled against `fills` resting orders
+#               through next_match()/apply_fill(), as the matcher does
+#   depth       aggregate one side for the order book view
+
+
+def _orders(count, levels, rng):
+    orders = []
+    for i in range(count):
+        side = 'buy' if i % 2 else 'sell'
+        tick = rng.randrange(1, levels + 1)
+        # Integer units; bids below 1.0, asks above it
+        price = 100_000_000 - tick * 1000 if side == 'buy' else 100_000_000 + tick * 1000
+        orders.append(Order(i + 1, 'bench', side, price, rng.randrange(1, 1000) * 100_000_000, i))
+    return orders
+
+
+def _per_op(seconds, ops):
+    return round(seconds / ops * 1e9, 1) if ops else None
+
+
+def bench_book(size, levels=None, fills=1000, seed=1):
+    rng = random.Random(seed)
+    levels = levels or max(10, size // 10)
+    orders = _orders(size, levels, rng)
+    book = OrderBook('PEK', 'SWAP.HIVE')
+
+    gc.collect()
+    started = time.perf_counter()
+    for order in orders:
+        book.add(order)
+    build = time.perf_counter() - started
+
+    lookups = 10_000
+    started = time.perf_counter()
+    for _ in range(lookups):
+        book.best_bid()
+        book.best_ask()
+    best_price = time.perf_counter() - started
+
+    started = time.perf_counter()
+    aggregated = book.depth('buy')
+    depth = time.perf_counter() - started
+
+    # One taker buy big enough to sweep `fills` asks
+    taker = Order(size + 1, 'taker', 'buy', 100_000_000 + (levels + 1) * 1000, 10 ** 18, size + 1)
+    book.add(taker)
+    done = 0
+    started = time.perf_counter()
+    while done < fills:
+        match = book.next_match()
+        if match is None:
+            break
+        buy, sell, _, amount = match
+        book.apply_fill(buy, sell, amount)
+        done += 1
+    sweep = time.perf_counter() - started
+
+    return {
+        'name': f'orderbook_{size}',
+        'orders': size,
+        'price_levels': levels,
+        'build_seconds': round(build, 4),
+        'add_ns_per_order': _per_op(build, size),
+        'best_price_ns_per_lookup': _per_op(best_price, lookups * 2),
+        'depth_seconds': round(depth, 4),
+        'depth_levels': len(aggregated),
+        'fills': done,
+        'sweep_seconds': round(sweep, 4),
+        'fill_ns': _per_op(sweep, done),
+    }
+
+
+TIMINGS = ('build_seconds', 'add_ns_per_order', 'best_price_ns_per_lookup', 'depth_seconds', 'sweep_seconds', 'fill_ns')
+
+
+def run(sizes=(1_000, 100_000, 1_000_000), fills=1000, seed=1, repeat=3):
+    """Best of `repeat` runs per size; the minimum is the least noisy estimate"""
+    results = []
+    for size in sizes:
+        print(f"[bench] order book with {size} orders (best of {repeat})...")
+        runs = [bench_book(size, fills=fills, seed=seed) for _ in range(repeat)]
+        best = dict(runs[0], repeat=repeat)
+        for key in TIMINGS:
+            best[key] = min(r[key] for r in runs)
+        results.append(best)
+    return results
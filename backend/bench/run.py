@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Benchmark runner: python -m bench.run (from the backend directory).
+# Writes one JSON document with run metadata, the order book
+# microbenchmarks, the cold start and the HTTP scenarios; --compare checks it against an
+# earlier result and exits non-zero on regressions.
+
+# The backend modules are imported by name, as app.py does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# (section, metric, True if higher is better)
+COMPARED_METRICS = [
+    ('matcher', 'add_ns_per_order', False),
+    ('matcher', 'best_price_ns_per_lookup', False),
+    ('matcher', 'fill_ns', False),
+    ('matcher', 'depth_seconds', False),
+    ('http', 'requests_per_sec', True),
+    ('http', 'latency_ms.p50', False),
+    ('http', 'latency_ms.p99', False),
+    ('startup', 'first_response_ms', False),
+]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _get(result, path):
+    for key in path.split('.'):
+        result = (result or {}).get(key)
+    return result
+
+
+def run_http(args, upstream_url):
+    # The app reads its upstream URLs and the database path at import time
+    os.environ['HIVE_ENGINE_NODES'] = upstream_url
+    os.environ['HIVE_NODES'] = upstream_url
+    os.environ.setdefault('TRADE_SYNC_INTERVAL', '3600')
+    # Keep benchmark orders off the real FTP backup: no restore, no default config, no uploads
+    os.environ['FTP_BACKUP'] = 'off'
+    os.chdir(tempfile.mkdtemp(prefix='peakedex-bench-'))
+    import app as backend
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from bench import http_load
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    flask_app = backend.create_app()
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        return http_load.run(f'http://127.0.0.1:{server.server_port}', total=args.http_requests,
+                             concurrency=args.concurrency)
+    finally:
+        server.shutdown()
+
+
+def compare(current, baseline, threshold):
+    """Print per-metric changes; returns the number of regressions beyond threshold"""
+    regressions = 0
+    for section, metric, higher_is_better in COMPARED_METRICS:
+        old_results = {r['name']: r for r in baseline.get(section, [])}
+        for result in current.get(section, []):
+            new, old = _get(result, metric), _get(old_results.get(result['name']), metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > threshold else ''
+            regressions += bool(flag)
+            print(f"{result['name']:<22} {metric:<26} {old:>12} -> {new:>12} {change:+7.1%} {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Peake DEX benchmarks')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='order book sizes, comma-separated')
+    parser.add_argument('--fills', type=int, default=1000, help='fills per sweep')
+    parser.add_argument('--repeat', type=int, default=3, help='order book runs per size (best is reported)')
+    parser.add_argument('--http-requests', type=int, default=2000, help='requests per HTTP scenario')
+    parser.add_argument('--concurrency', type=int, default=16, help='HTTP client threads')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake upstream latency (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random upstream latency (seconds)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skip-matcher', action='store_true')
+    parser.add_argument('--skip-http', action='store_true')
+    parser.add_argument('--skip-startup', action='store_true')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before flagging (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    results = {
+        'meta': {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+    }
+    if not args.skip_matcher:
+        from bench import matcher
+        sizes = [int(size) for size in args.sizes.split(',') if size]
+        results['matcher'] = matcher.run(sizes, fills=args.fills, seed=args.seed, repeat=args.repeat)
+    if not (args.skip_http and args.skip_startup):
+        from bench.fake_engine import FakeHiveEngine
+        fake = FakeHiveEngine(latency=args.latency, jitter=args.jitter, seed=args.seed)
+        upstream_url = fake.start()
+        try:
+            if not args.skip_startup:
+                from bench import startup
+                results['startup'] = startup.run(BACKEND_DIR, upstream_url, repeat=args.repeat)
+            if not args.skip_http:
+                results['http'] = run_http(args, upstream_url)
+        finally:
+            results['meta']['upstream_calls'] = fake.calls
+            fake.stop()
+
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        print(f"[bench] results written to {output}")
+    else:
+        print(text)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"[bench] {regressions} regression(s) beyond {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+# Cold start: launch a fresh backend process (empty database, FTP backup off)
+# and time how long it takes to answer /api/pairs, then read its own startup
+# phases from /api/ready once the background startup tasks are done.
+
+SERVER = '''
+import sys
+sys.path.insert(0, {backend!r})
+from werkzeug.serving import make_server
+import app
+make_server('127.0.0.1', {port}, app.create_app(), threaded=True).serve_forever()
+'''
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait(url, timeout, accept=(200,)):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code in accept:
+                return response
+        except requests.RequestException:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f'{url} did not answer within {timeout}s')
+
+
+def cold_start(backend_dir, upstream_url, timeout=60):
+    port = _free_port()
+    env = dict(os.environ, HIVE_ENGINE_NODES=upstream_url, HIVE_NODES=upstream_url, TRADE_SYNC_INTERVAL='3600', FTP_BACKUP='off')
+    started = time.monotonic()
+    proc = subprocess.Popen([sys.executable, '-c', SERVER.format(backend=backend_dir, port=port)],
+                            cwd=tempfile.mkdtemp(prefix='peakedex-startup-'), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        _wait(f'{base_url}/api/pairs', timeout)
+        first_response = time.monotonic() - started
+        ready = _wait(f'{base_url}/api/ready', timeout).json()
+        return first_response, ready
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run(backend_dir, upstream_url, repeat=3):
+    """Best of `repeat` cold starts"""
+    print(f"[bench] cold start (best of {repeat})...")
+    runs = [cold_start(backend_dir, upstream_url) for _ in range(repeat)]
+    first_response, ready = min(runs, key=lambda r: r[0])
+    return [{
+        'name': 'cold_start',
+        'first_response_ms': round(first_response * 1000, 1),
+        'phases_ms': {phase: round(seconds * 1000, 1) for phase, seconds in ready['phases'].items()},
+    }]
@@ -0,0 +1,69 @@
+from decimal import ROUND_DOWN, ROUND_UP, Decimal, InvalidOperation
+
+# Server-side order book depth for /api/orderbook.
+# Upstream orders are summed per price level, optionally bucketed to a tick
+# of 10^-precision (bids round down and asks round up, so a bucket never
+# looks better than the orders in it), cut to `depth` levels per side and
+# encoded either as {price, quantity[, total]} objects or as compact
+# [price, quantity[, total]] arrays. `total` is the cumulative quantity from
+# the best level outwards.
+
+MAX_PRECISION = 12
+
+
+def _format_quantity(value):
+    return format(value.normalize(), 'f')
+
+
+def aggregate_side(orders, side, depth=None, precision=None, cumulative=False, compact=False):
+    """Price levels for one side ('bids' or 'asks'), best first"""
+    tick = Decimal(1).scaleb(-precision) if precision is not None else None
+    rounding = ROUND_DOWN if side == 'bids' else ROUND_UP
+    levels = {}
+    for order in orders or []:
+        try:
+            price = Decimal(str(order['price']))
+            quantity = Decimal(str(order.get('quantity', '0')))
+            if not price.is_finite() or not quantity.is_finite():
+                continue
+            if tick is not None:
+                # Raises InvalidOperation when the price has too many digits for the tick
+                price = price.quantize(tick, rounding=rounding)
+        except (KeyError, TypeError, InvalidOperation):
+            continue
+        levels[price] = levels.get(price, Decimal(0)) + quantity
+    prices = sorted(levels, reverse=(side == 'bids'))
+    if depth is not None:
+        prices = prices[:depth]
+    rows = []
+    total = Decimal(0)
+    for price in prices:
+        quantity = levels[price]
+        total += quantity
+        # Bucketed prices keep their trailing zeros, so every level has `precision` decimals
+        price_text = format(price, 'f')
+        if compact:
+            row = [price_text, _format_quantity(quantity)]
+            if cumulative:
+                row.append(_format_quantity(total))
+        else:
+            row = {'price': price_text, 'quantity': _format_quantity(quantity)}
+            if cumulative:
+                row['total'] = _format_quantity(total)
+        rows.append(row)
+    return rows
+
+
+def build_depth(book, base, quote, depth=None, precision=None, cumulative=False, compact=False):
+    book = book or {}
+    return {
+        'base': base,
+        'quote': quote,
+        'format': 'compact' if compact else 'levels',
+        'depth': depth,
+        'precision': precision,
+        'cumulative': cumulative,
+        'bids': aggregate_side(book.get('bids'), 'bids', depth, precision, cumulative, compact),
+        'asks': aggregate_side(book.get('asks'), 'asks', depth, precision, cumulative, compact),
+    }
+
@@ -0,0 +1,277 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from hive_engine import JsonRpcError
+
+# Durable, asynchronous broadcasting of matched trades to Hive.
+# The matcher only inserts a broadcast_jobs row per fill, in the same
+# transaction that updates the orders, keyed by an idempotency key so a fill
+# is queued exactly once. Worker threads claim the oldest due jobs of one
+# account at a time and send them as a single Hive transaction carrying one
+# custom_json op per fill.
+#
+# The signed transaction is stored before it is broadcast, and retries
+# re-send that same transaction until it expires; Hive rejects a duplicate
+# transaction id, so re-sending after an unknown outcome is safe. Signing
+# again is not: the new transaction has a new id. So the batch is only
+# re-signed once the stored transaction is `expiry_margin` seconds past its
+# expiration by the local clock (covering a clock running ahead of the
+# chain) and get_transaction does not find it. A local clock off by more
+# than the margin can still lead to a double broadcast.
+
+BROADCAST_SQL = [
+    '''CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        account TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        trx_id TEXT,
+        signed_tx TEXT,
+        expires_at REAL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_broadcast_due ON broadcast_jobs (status, next_attempt_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_broadcast_trx ON broadcast_jobs (trx_id)',
+]
+
+# beem is slow to import, so it is loaded on the first signed transaction
+# rather than at startup.
+
+# Hive Engine sidechain id for custom_json operations
+ENGINE_ID = 'ssc-mainnet-hive'
+
+
+class BeemTradeChain:
+    """Signs batches of Hive Engine custom_json ops with beem and broadcasts them over JSON-RPC"""
+
+    def __init__(self, rpc, key_for):
+        # rpc is a JsonRpcClient for Hive nodes; key_for(account) returns the
+        # account's active key, or '' if none
+        self.rpc = rpc
+        self.key_for = key_for
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def _hive(self, account):
+        # One keyed Hive instance per account; workers never share an account
+        with self._lock:
+            hive = self._instances.get(account)
+            if hive is None:
+                active_key = self.key_for(account)
+                if not active_key:
+                    raise Exception(f"No active key configured for {account}")
+                from beem import Hive
+                nodes = [endpoint.url for endpoint in self.rpc.nodes.ranked()]
+                hive = self._instances[account] = Hive(keys=[active_key], node=nodes)
+            return hive
+
+    def sign(self, account, payloads):
+        """Build and sign one transaction; returns (trx_id, signed_tx, expires_at)"""
+        from beem.transactionbuilder import TransactionBuilder
+        from beembase.operations import Custom_json
+        tx = TransactionBuilder(blockchain_instance=self._hive(account))
+        for payload in payloads:
+            tx.appendOps(Custom_json(**{
+                'required_auths': [account],
+                'required_posting_auths': [],
+                'id': ENGINE_ID,
+                'json': payload,
+            }))
+        tx.appendSigner(account, 'active')
+        signed = tx.sign()
+        signed_tx = tx.json()
+        expires_at = datetime.fromisoformat(signed_tx['expiration']).replace(tzinfo=timezone.utc).timestamp()
+        return signed.id, signed_tx, expires_at
+
+    def send(self, account, signed_tx):
+        # Fails over between nodes but is never hedged
+        try:
+            self.rpc.call('condenser_api.broadcast_transaction', [signed_tx], hedge=False)
+        except JsonRpcError as e:
+            if 'duplicate' in str(e).lower():
+                return  # Already accepted by an earlier attempt
+            raise
+
+    def find(self, account, trx_id):
+        """True if the transaction made it into a block"""
+        try:
+            self.rpc.call('condenser_api.get_transaction', [trx_id])
+            return True
+        except JsonRpcError as e:
+            if 'unknown' in str(e).lower():
+                return False
+            raise
+
+
+class BroadcastQueue:
+    def __init__(self, db, chain, workers=2, max_batch=10, retry_backoff=2.0,
+                 max_backoff=300.0, max_attempts=20, poll_interval=5.0, expiry_margin=60.0):
+        self.db = db
+        self.chain = chain
+        self.workers = workers
+        self.max_batch = max_batch
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.expiry_margin = expiry_margin
+        self._cond = threading.Condition()
+        self._busy_accounts = set()
+        self._threads = []
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+
+    def init_db(self):
+        with self.db.connection() as conn:
+            for sql in BROADCAST_SQL:
+                conn.execute(sql)
+            conn.commit()
+
+    @staticmethod
+    def enqueue(conn, idempotency_key, account, payload):
+        """Queue one custom_json payload inside the caller's transaction"""
+        now = time.time()
+        conn.execute('''INSERT OR IGNORE INTO broadcast_jobs
+                        (idempotency_key, account, payload, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?)''',
+                     (idempotency_key, account, json.dumps(payload, separators=(',', ':')), now, now))
+
+    def notify(self):
+        """Wake the workers after new jobs were committed"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def start(self):
+        if self._threads:
+            return
+        with self.db.connection() as conn:
+            # Jobs claimed by a process that died; their signed tx (if any) is re-sent as is
+            conn.execute("UPDATE broadcast_jobs SET status='pending' WHERE status='sending'")
+            conn.commit()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _claim(self):
+        """Mark the next batch of due jobs for one account as sending; None if there is none"""
+        with self._cond, self.db.connection() as conn:
+            busy = sorted(self._busy_accounts)
+            skip = f" AND account NOT IN ({', '.join('?' * len(busy))})" if busy else ''
+            head = conn.execute(f'''SELECT account, trx_id FROM broadcast_jobs
+                                    WHERE status='pending' AND next_attempt_at <= ?{skip}
+                                    ORDER BY id LIMIT 1''', [time.time(), *busy]).fetchone()
+            if head is None:
+                return None
+            account, trx_id = head
+            if trx_id is not None:
+                # Retry the whole previously signed transaction
+                rows = conn.execute('''SELECT id, payload, attempts, trx_id, signed_tx, expires_at
+                                       FROM broadcast_jobs WHERE trx_id=? AND status='pending' ORDER BY id''',
+                                    (trx_id,)).fetchall()
+            else:
+                rows = conn.execute('''SELECT id, payload, attempts, trx_id, signed_tx, expires_at
+                                       FROM broadcast_jobs
+                                       WHERE account=? AND status='pending' AND trx_id IS NULL AND next_attempt_at <= ?
+                                       ORDER BY id LIMIT ?''',
+                                    (account, time.time(), self.max_batch)).fetchall()
+            conn.executemany("UPDATE broadcast_jobs SET status='sending', attempts=attempts+1 WHERE id=?",
+                             [(row[0],) for row in rows])
+            conn.commit()
+            self._busy_accounts.add(account)
+            return account, rows
+
+    def _next_due_in(self):
+        with self.db.connection() as conn:
+            due = conn.execute("SELECT MIN(next_attempt_at) FROM broadcast_jobs WHERE status='pending'").fetchone()[0]
+        if due is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.05, due - time.time()))
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                print(f"Broadcast queue error: {e}")
+                claimed = None
+            if claimed is None:
+                wait = self._next_due_in()
+                with self._cond:
+                    self._cond.wait(wait)
+                continue
+            account, rows = claimed
+            try:
+                self._process(account, rows)
+            finally:
+                with self._cond:
+                    self._busy_accounts.discard(account)
+                    self._cond.notify_all()
+
+    def _set(self, ids, sql, params=()):
+        with self.db.connection() as conn:
+            conn.executemany(f'UPDATE broadcast_jobs SET {sql}, updated_at=? WHERE id=?',
+                             [(*params, time.time(), job_id) for job_id in ids])
+            conn.commit()
+
+    def _process(self, account, rows):
+        ids = [row[0] for row in rows]
+        attempts = max(row[2] for row in rows) + 1
+        _, _, _, trx_id, signed_tx, expires_at = rows[0]
+        signed_tx = json.loads(signed_tx) if signed_tx else None
+        try:
+            now = time.time()
+            if trx_id is not None and expires_at <= now < expires_at + self.expiry_margin:
+                # Expired by our clock, but maybe not yet by the chain's: neither re-send nor re-sign
+                # until the margin has passed. Waiting is not a failed attempt.
+                self._set(ids, "status='pending', attempts=attempts-1, next_attempt_at=?",
+                          (expires_at + self.expiry_margin,))
+                return
+            if trx_id is not None and now >= expires_at + self.expiry_margin:
+                # The stored transaction can no longer be included; it either made it or never will
+                if self.chain.find(account, trx_id):
+                    self._set(ids, "status='done', last_error=NULL")
+                    self.sent += len(ids)
+                    return
+                trx_id = None
+            if trx_id is None:
+                trx_id, signed_tx, expires_at = self.chain.sign(account, [json.loads(row[1]) for row in rows])
+                # Persist before sending so a retry re-sends this exact transaction
+                self._set(ids, 'trx_id=?, signed_tx=?, expires_at=?', (trx_id, json.dumps(signed_tx), expires_at))
+            self.chain.send(account, signed_tx)
+        except Exception as e:
+            self.failures += 1
+            if attempts >= self.max_attempts:
+                print(f"Broadcast for {account} failed permanently after {attempts} attempts: {e}")
+                self._set(ids, "status='failed', last_error=?", (str(e),))
+            else:
+                delay = min(self.max_backoff, self.retry_backoff * (2 ** (attempts - 1)))
+                print(f"Broadcast for {account} failed (attempt {attempts}): {e}")
+                self._set(ids, "status='pending', next_attempt_at=?, last_error=?",
+                          (time.time() + random.uniform(delay / 2, delay), str(e)))
+            return
+        self._set(ids, "status='done', last_error=NULL")
+        self.sent += len(ids)
+        self.batches += 1
+        print(f"Broadcast {len(ids)} trade(s) for {account} in tx {trx_id}")
+
+    def status(self):
+        with self.db.connection() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM broadcast_jobs GROUP BY status').fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM broadcast_jobs WHERE status IN ('pending', 'sending')").fetchone()[0]
+        return {
+            'jobs': counts,
+            'oldest_pending_seconds': round(time.time() - oldest, 3) if oldest else 0,
+            'sent': self.sent,
+            'batches': self.batches,
+            'failures': self.failures,
+        }
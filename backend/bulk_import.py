@@ -0,0 +1,193 @@
+import codecs
+import json
+import time
+
+from units import to_units
+
+# Streaming bulk import of orders (FTP restore and /api/ftp/import).
+# Records are parsed incrementally, staged with batched executemany() calls
+# and merged into orders with one INSERT OR IGNORE on the original id, all in
+# a single transaction. Orders that already exist locally are never touched.
+
+IMPORT_BATCH_SIZE = 1000
+PROGRESS_EVERY = 50000
+READ_CHUNK_SIZE = 64 * 1024
+
+STAGING_COLUMNS = 'id, username, base, quote, amount, price, side, status, created_at'
+
+# Characters that can continue a JSON number
+NUMBER_CHARS = '0123456789.eE+-'
+
+
+def iter_json_array(fileobj, key):
+    """Yield the items of the top-level array `key` from a JSON object, one at a time.
+
+    Only the item being decoded is held in memory, so a multi-gigabyte
+    {"orders": [...]} dump is read in constant space. The object's members
+    are walked key by key (other members' values are decoded and dropped),
+    so the key's text inside an earlier string value is never mistaken for it.
+    """
+    decoder = json.JSONDecoder()
+    # Incremental, so a multibyte character split across two chunks decodes intact
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = fileobj.read(READ_CHUNK_SIZE)
+        if not data:
+            eof = True
+        chunk = utf8.decode(data, final=eof) if isinstance(data, bytes) else data
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip(chars=' \t\r\n'):
+        """Advance past `chars`; returns the next character, or '' at the end of input"""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return ''
+            fill()
+
+    def decode():
+        """Decode the JSON value at pos, reading more input until it is complete"""
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            rest = end
+            while rest < len(buf) and buf[rest] in NUMBER_CHARS:
+                rest += 1
+            if rest == len(buf) and not eof:
+                fill()  # A number may go on in the next chunk ("7." + "25")
+                continue
+            pos = end
+            return value
+
+    def expect(char):
+        nonlocal pos
+        if skip() != char:
+            raise json.JSONDecodeError(f'Expecting {char!r}', buf, pos)
+        pos += 1
+
+    # Walk the top-level object up to the member named `key`
+    if skip(' \t\r\n\ufeff') != '{':
+        return
+    pos += 1
+    while True:
+        if skip(' \t\r\n,') in ('}', ''):
+            return
+        name = decode()
+        expect(':')
+        if name == key:
+            break
+        skip()
+        decode()
+    if skip() != '[':
+        return
+    pos += 1
+
+    while True:
+        if skip(' \t\r\n,') in (']', ''):
+            return
+        yield decode()
+
+
+def _staging_row(order):
+    base = order.get('base')
+    quote = order.get('quote')
+    return (
+        order.get('id'),
+        order.get('username'),
+        base,
+        quote,
+        to_units(order.get('amount'), base),
+        to_units(order.get('price'), quote),
+        order.get('side'),
+        order.get('status', 'pending'),
+        order.get('created_at'),
+    )
+
+
+def import_orders(db, records, batch_size=IMPORT_BATCH_SIZE, label='import'):
+    """Import (op, order) records; op is 'upsert' or 'delete'.
+
+    Later records for the same id replace earlier ones (journal replay), then
+    the result is merged with INSERT OR IGNORE so existing orders win.
+    Returns a stats dict; 'pairs' lists the [base, quote] pairs that gained
+    pending orders, whose resident books need a reload.
+    """
+    started = time.monotonic()
+    read = skipped = 0
+    upserts = []
+    deletes = []
+    deleted_ids = set()
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute('DROP TABLE IF EXISTS temp.orders_import')
+        c.execute(f'CREATE TEMP TABLE orders_import ({STAGING_COLUMNS}, PRIMARY KEY (id))')
+
+        def flush():
+            if upserts:
+                c.executemany(f'INSERT OR REPLACE INTO temp.orders_import ({STAGING_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', upserts)
+                upserts.clear()
+            if deletes:
+                c.executemany('DELETE FROM temp.orders_import WHERE id = ?', deletes)
+                deletes.clear()
+                deleted_ids.clear()
+
+        for op, order in records:
+            read += 1
+            if order.get('id') is None:
+                skipped += 1
+                continue
+            if op == 'delete':
+                # Keep statement order: pending upserts for this id go first
+                flush()
+                deletes.append((order['id'],))
+                deleted_ids.add(order['id'])
+            else:
+                try:
+                    row = _staging_row(order)
+                except ValueError:
+                    skipped += 1  # Malformed amount/price
+                    continue
+                if order['id'] in deleted_ids:
+                    # Deletes run after upserts in flush(); apply this id's delete first
+                    flush()
+                upserts.append(row)
+            if len(upserts) >= batch_size:
+                flush()
+            if read % PROGRESS_EVERY == 0:
+                elapsed = time.monotonic() - started
+                print(f"[{label}] {read} orders read ({read / elapsed:.0f} rows/s)")
+        flush()
+        c.execute('''SELECT DISTINCT base, quote FROM temp.orders_import i
+                     WHERE status = 'pending' AND NOT EXISTS (SELECT 1 FROM orders o WHERE o.id = i.id)''')
+        pairs = [list(pair) for pair in c.fetchall()]
+        c.execute(f'INSERT OR IGNORE INTO orders ({STAGING_COLUMNS}) SELECT {STAGING_COLUMNS} FROM temp.orders_import ORDER BY id')
+        imported = c.rowcount  # Excludes rows written by the journal triggers
+        c.execute('DROP TABLE temp.orders_import')
+        conn.commit()
+    elapsed = time.monotonic() - started
+    stats = {
+        'read': read,
+        'imported': imported,
+        'skipped': skipped,
+        'pairs': pairs,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(read / elapsed) if elapsed > 0 else read,
+    }
+    print(f"[{label}] done: {stats}")
+    return stats
@@ -0,0 +1,172 @@
+import threading
+from decimal import Decimal, InvalidOperation
+
+# Incremental OHLCV candles at fixed resolutions.
+# Each trade is folded into the bucket it falls in for every interval and the
+# touched buckets are upserted, so the candles table is always current and a
+# range query reads only the buckets it returns. Upstream trades are folded in
+# _id order and the last folded _id per pair is stored with the candles, which
+# lets catch_up() resume from the trades table after a restart without
+# counting anything twice. Upstream trades are the only source: local fills
+# are broadcast to Hive Engine and come back as market.trades rows, so
+# folding them here as well would count them twice.
+
+INTERVALS = {
+    '1m': 60,
+    '5m': 300,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+MAX_CANDLES = 5000
+
+CANDLES_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS candles (
+    base TEXT NOT NULL,
+    quote TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    open TEXT,
+    high TEXT,
+    low TEXT,
+    close TEXT,
+    volume TEXT,
+    trades INTEGER,
+    PRIMARY KEY (base, quote, interval, bucket)
+) WITHOUT ROWID'''
+
+CANDLE_STATE_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS candle_state (
+    base TEXT NOT NULL,
+    quote TEXT NOT NULL,
+    last_trade_id INTEGER,
+    PRIMARY KEY (base, quote)
+)'''
+
+
+class Candle:
+    __slots__ = ('bucket', 'open', 'high', 'low', 'close', 'volume', 'trades')
+
+    def __init__(self, bucket, open, high, low, close, volume, trades):
+        self.bucket = bucket
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.trades = trades
+
+    def add(self, price, quantity):
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += quantity
+        self.trades += 1
+
+    def to_row(self):
+        return (self.bucket, str(self.open), str(self.high), str(self.low), str(self.close), str(self.volume), self.trades)
+
+
+class CandleEngine:
+    def __init__(self, db, intervals=INTERVALS):
+        self.db = db
+        self.intervals = intervals
+        self._lock = threading.Lock()
+        # Latest bucket per (base, quote, interval); older buckets live only in SQLite
+        self._current = {}
+        self._last_trade_ids = {}
+
+    def init_db(self):
+        with self.db.connection() as conn:
+            conn.execute(CANDLES_TABLE_SQL)
+            conn.execute(CANDLE_STATE_TABLE_SQL)
+            for base, quote, last_trade_id in conn.execute('SELECT base, quote, last_trade_id FROM candle_state'):
+                self._last_trade_ids[(base, quote)] = last_trade_id
+            conn.commit()
+
+    def _load(self, c, base, quote, interval, bucket):
+        row = c.execute('SELECT open, high, low, close, volume, trades FROM candles WHERE base=? AND quote=? AND interval=? AND bucket=?',
+                        (base, quote, interval, bucket)).fetchone()
+        if row is None:
+            return None
+        o, h, l, cl, v, n = row
+        return Candle(bucket, Decimal(o), Decimal(h), Decimal(l), Decimal(cl), Decimal(v), n)
+
+    def _fold(self, c, base, quote, timestamp, price, quantity, touched):
+        for interval, seconds in self.intervals.items():
+            bucket = timestamp - timestamp % seconds
+            key = (base, quote, interval)
+            candle = self._current.get(key)
+            if candle is None or candle.bucket != bucket:
+                loaded = touched.get((key, bucket)) or self._load(c, base, quote, interval, bucket)
+                if loaded is None:
+                    loaded = Candle(bucket, price, price, price, price, Decimal(0), 0)
+                if candle is None or bucket > candle.bucket:
+                    self._current[key] = loaded
+                candle = loaded
+            candle.add(price, quantity)
+            touched[(key, bucket)] = candle
+
+    def _fold_batch(self, base, quote, trades, last_trade_id=None):
+        """trades: iterable of (timestamp, price, quantity) in time order"""
+        with self.db.connection() as conn:
+            c = conn.cursor()
+            touched = {}
+            for timestamp, price, quantity in trades:
+                self._fold(c, base, quote, timestamp, price, quantity, touched)
+            c.executemany('''INSERT OR REPLACE INTO candles (base, quote, interval, bucket, open, high, low, close, volume, trades)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                          [(key[0], key[1], key[2]) + candle.to_row() for (key, _), candle in touched.items()])
+            if last_trade_id is not None:
+                c.execute('INSERT OR REPLACE INTO candle_state (base, quote, last_trade_id) VALUES (?, ?, ?)',
+                          (base, quote, last_trade_id))
+            conn.commit()
+
+    def add_upstream_trades(self, base, quote, trades):
+        """Fold Hive Engine trade rows, skipping any _id that was already folded"""
+        with self._lock:
+            last_id = self._last_trade_ids.get((base, quote))
+            batch = []
+            for t in sorted(trades, key=lambda t: int(t['_id'])):
+                trade_id = int(t['_id'])
+                if last_id is not None and trade_id <= last_id:
+                    continue
+                try:
+                    batch.append((int(t['timestamp']), Decimal(str(t['price'])), Decimal(str(t['quantity']))))
+                except (KeyError, TypeError, ValueError, InvalidOperation):
+                    pass
+                last_id = trade_id
+            if last_id is None or last_id == self._last_trade_ids.get((base, quote)):
+                return
+            self._fold_batch(base, quote, batch, last_trade_id=last_id)
+            self._last_trade_ids[(base, quote)] = last_id
+
+    def catch_up(self, trade_store, pairs, batch_size=5000):
+        """Fold trades already in the local trades table that the candles have not seen"""
+        for base, quote in pairs:
+            while True:
+                trades = trade_store.trades_after(base, quote, self._last_trade_ids.get((base, quote)), batch_size)
+                if not trades:
+                    break
+                self.add_upstream_trades(base, quote, trades)
+                if len(trades) < batch_size:
+                    break
+
+    def query(self, base, quote, interval, start=None, end=None, limit=MAX_CANDLES):
+        """Candles for [start, end] bucket times, oldest first"""
+        sql = 'SELECT bucket, open, high, low, close, volume, trades FROM candles WHERE base=? AND quote=? AND interval=?'
+        args = [base, quote, interval]
+        if start is not None:
+            sql += ' AND bucket >= ?'
+            args.append(int(start))
+        if end is not None:
+            sql += ' AND bucket <= ?'
+            args.append(int(end))
+        sql += ' ORDER BY bucket ASC LIMIT ?'
+        args.append(max(1, min(int(limit), MAX_CANDLES)))
+        with self.db.connection() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [
+            {'time': b, 'open': o, 'high': h, 'low': l, 'close': cl, 'volume': v, 'trades': n}
+            for b, o, h, l, cl, v, n in rows
+        ]
@@ -0,0 +1,173 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+# Managed SQLite access.
+# - Connections are pooled and reused instead of opened per request.
+# - The database runs in WAL mode, so readers are not blocked by the matcher
+#   or other writers, with pragmas tuned for a small, write-heavy order store.
+# - GroupCommitWriter funnels single-row writes through one connection and
+#   commits everything queued at that moment in one transaction (one fsync).
+
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'FULL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '8'))
+
+
+class Database:
+    def __init__(self, path, pool_size=SQLITE_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._wal_lock = threading.Lock()
+        self._wal_set = False
+
+    def new_connection(self, autocommit=False):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False,
+                               isolation_level=None if autocommit else '')
+        # journal_mode is persistent in the database file; set it once per process
+        with self._wal_lock:
+            if not self._wal_set:
+                conn.execute('PRAGMA journal_mode=WAL')
+                self._wal_set = True
+        conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-16000')
+        conn.execute('PRAGMA mmap_size=268435456')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; an open transaction is committed on success
+        and rolled back on error before the connection goes back to the pool."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self.new_connection()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if self._pool.qsize() < self.pool_size:
+                self._pool.put(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class GroupCommitWriter:
+    """Single writer thread that batches queued statements into one transaction.
+
+    execute() blocks until the statement is committed and returns its
+    lastrowid. A failing statement is rolled back to its own savepoint and
+    raises in its caller only; the rest of the batch still commits. With a
+    timeout, a statement the writer has not started yet is withdrawn and
+    FutureTimeoutError raised, so the caller knows it was not stored.
+    """
+
+    def __init__(self, db, max_batch=256):
+        self.db = db
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.statements = 0
+
+    def submit(self, sql, params=()):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((sql, params, future))
+        return future
+
+    def execute(self, sql, params=(), timeout=None):
+        future = self.submit(sql, params)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise
+            # Already in the writer's open transaction: wait for its commit
+            return future.result()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            # Whatever queued up while the previous commit was syncing joins this one
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self.db.new_connection(autocommit=True)
+                self._commit(conn, batch)
+            except Exception as e:
+                # Never let the writer die with callers waiting: fail this batch
+                # and start over on a fresh connection
+                print(f"Group commit writer error: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for sql, params, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue  # The caller timed out and withdrew it
+                conn.execute('SAVEPOINT item')
+                try:
+                    cur = conn.execute(sql, params)
+                    conn.execute('RELEASE item')
+                    results.append((future, cur.lastrowid, None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO item')
+                    conn.execute('RELEASE item')
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.statements += len(results)
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
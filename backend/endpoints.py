@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+# Health-aware registry of interchangeable upstream nodes.
+# Every call records its latency and outcome against the node it went to.
+# ranked() orders the healthy nodes fastest first (rolling latency, penalised
+# by the recent error rate). A node that fails `trip_after` times in a row,
+# or whose error rate over the window crosses `error_threshold`, has its
+# circuit opened and is skipped for `cooldown` seconds; after that a single
+# probe call is let through, and its outcome closes or re-opens the circuit.
+# Only ranked(probe=True), used right before sending, claims the probe; a
+# plain ranked() just lists the nodes. An unanswered probe is given up on
+# after another cooldown.
+
+
+def parse_urls(value):
+    """Comma-separated URL list from an env var"""
+    return [url.strip() for url in value.split(',') if url.strip()]
+
+
+class Endpoint:
+    def __init__(self, url, window):
+        self.url = url
+        self.host = urlsplit(url).netloc
+        self.samples = deque(maxlen=window)  # (ok, seconds)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self.calls = 0
+        self.errors = 0
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    def latency(self, quantile=0.5):
+        """Latency quantile over the successful calls in the window; None when unknown"""
+        times = sorted(seconds for ok, seconds in self.samples if ok)
+        if not times:
+            return None
+        return times[min(len(times) - 1, int(quantile * len(times)))]
+
+    def score(self):
+        # Untried nodes score 0 so they get measured; nodes with only failures go last
+        if not self.samples:
+            return 0.0
+        latency = self.latency()
+        if latency is None:
+            return float('inf')
+        return latency * (1 + 4 * self.error_rate())
+
+
+class EndpointRegistry:
+    def __init__(self, urls, window=50, trip_after=3, error_threshold=0.5, min_samples=10, cooldown=30.0):
+        if not urls:
+            raise ValueError('At least one endpoint URL is required')
+        self.window = window
+        self.trip_after = trip_after
+        self.error_threshold = error_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.endpoints = [Endpoint(url, window) for url in urls]
+        self._lock = threading.Lock()
+
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def ranked(self, probe=False):
+        """Endpoints to try, best first; never empty.
+
+        Pass probe=True only when a call is sent to the first endpoint right
+        away: a half-open node listed first is then marked as being probed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            closed, probes, still_open = [], [], []
+            for endpoint in self.endpoints:
+                if endpoint.opened_at is None:
+                    closed.append(endpoint)
+                elif (now - endpoint.opened_at >= self.cooldown and
+                      (endpoint.probe_started is None or now - endpoint.probe_started >= self.cooldown)):
+                    probes.append(endpoint)
+                else:
+                    still_open.append(endpoint)
+            closed.sort(key=Endpoint.score)
+            # Half-open: one trial call after the cooldown
+            if probe:
+                for endpoint in probes[:1]:
+                    endpoint.probe_started = now
+            # With every circuit open, try the one that opened first rather than nothing
+            still_open.sort(key=lambda e: e.opened_at)
+            return probes[:1] + closed + (still_open[:1] if not closed and not probes else [])
+
+    def record(self, endpoint, ok, seconds):
+        with self._lock:
+            endpoint.samples.append((ok, seconds))
+            endpoint.calls += 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                if endpoint.opened_at is not None:
+                    # Probe succeeded: close, and forget the failures that tripped it
+                    endpoint.opened_at = None
+                    endpoint.samples.clear()
+                    endpoint.samples.append((ok, seconds))
+            else:
+                endpoint.errors += 1
+                endpoint.consecutive_failures += 1
+                failing = (endpoint.consecutive_failures >= self.trip_after or
+                           (len(endpoint.samples) >= self.min_samples and endpoint.error_rate() >= self.error_threshold) or
+                           # Never answered: open so it is re-probed instead of ranked last forever
+                           endpoint.latency() is None)
+                if endpoint.opened_at is not None or failing:
+                    if endpoint.opened_at is None:
+                        print(f"Circuit opened for {endpoint.url}")
+                    endpoint.opened_at = time.monotonic()
+            endpoint.probe_started = None
+
+    def status(self):
+        with self._lock:
+            return [{
+                'url': endpoint.url,
+                'state': 'closed' if endpoint.opened_at is None else 'open',
+                'p50_ms': round(endpoint.latency(0.5) * 1000, 1) if endpoint.latency(0.5) is not None else None,
+                'p90_ms': round(endpoint.latency(0.9) * 1000, 1) if endpoint.latency(0.9) is not None else None,
+                'error_rate': round(endpoint.error_rate(), 3),
+                'calls': endpoint.calls,
+                'errors': endpoint.errors,
+            } for endpoint in self.endpoints]
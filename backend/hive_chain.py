@@ -0,0 +1,59 @@
+import os
+from decimal import Decimal
+
+from endpoints import parse_urls
+from hive_engine import JsonRpcClient
+from market_cache import MarketDataCache
+
+# Hive (layer 1) reads over plain JSON-RPC.
+# Calls go through a JsonRpcClient, so they are routed to the fastest healthy
+# node in HIVE_NODES, fail over when a node errors and are hedged when a node
+# is slow. Accounts are cached, including negative results for unknown
+# names; existence and the HIVE balance are both read from the one cached
+# lookup, so a balance request costs at most one get_accounts call.
+
+HIVE_NODES = parse_urls(os.environ.get('HIVE_NODES', '') or os.environ.get('HIVE_NODE', "https://api.hive.blog"))
+HIVE_NODE = HIVE_NODES[0]
+
+ACCOUNT_CACHE_TTL = float(os.environ.get('ACCOUNT_CACHE_TTL', '300'))
+UNKNOWN_ACCOUNT_TTL = float(os.environ.get('UNKNOWN_ACCOUNT_TTL', '60'))
+ACCOUNT_CACHE_SIZE = int(os.environ.get('ACCOUNT_CACHE_SIZE', '10000'))
+# Only these fields are cached; a full account object is several KB
+CACHED_ACCOUNT_FIELDS = ('name', 'balance')
+
+
+class HiveChain:
+    def __init__(self, rpc):
+        self.rpc = rpc
+        self.accounts = MarketDataCache(ttl=ACCOUNT_CACHE_TTL, stale_ttl=ACCOUNT_CACHE_TTL,
+                                        max_entries=ACCOUNT_CACHE_SIZE, negative_ttl=UNKNOWN_ACCOUNT_TTL)
+
+    def get_account(self, username):
+        """Account object from condenser_api.get_accounts; None for unknown names"""
+        accounts = self.rpc.call('condenser_api.get_accounts', [[username]])
+        return accounts[0] if accounts else None
+
+    def _lookup(self, username):
+        # None is negative-cached for UNKNOWN_ACCOUNT_TTL
+        account = self.get_account(username)
+        return {field: account.get(field) for field in CACHED_ACCOUNT_FIELDS} if account else None
+
+    def cached_account(self, username):
+        """The cached fields of an account; None for unknown names"""
+        return self.accounts.get(username, lambda: self._lookup(username))
+
+    def account_exists(self, username):
+        return self.cached_account(username) is not None
+
+    def get_hive_balance(self, username):
+        """Available HIVE balance as a Decimal (as fresh as the account cache); ValueError for unknown names"""
+        account = self.cached_account(username)
+        if account is None:
+            raise ValueError(f"Unknown account {username}")
+        # e.g. "12.345 HIVE"
+        return Decimal(account['balance'].split()[0])
+
+
+# Shared instances
+rpc = JsonRpcClient(HIVE_NODES)
+chain = HiveChain(rpc)
@@ -0,0 +1,220 @@
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from endpoints import EndpointRegistry, parse_urls
+from metrics import registry as metrics
+
+# Shared HTTP/JSON-RPC client for Hive Engine and the other upstream APIs.
+# One requests.Session keeps TCP/TLS connections alive between calls, a
+# semaphore per host bounds concurrent upstream requests, and every call gets
+# the same (connect, read) timeout. JSON-RPC calls are routed through an
+# EndpointRegistry: each attempt goes to the fastest healthy node, failures
+# fail over to the next one with jittered exponential backoff, and reads are
+# hedged (a second node is asked if the first is slower than usual).
+# Plain post()/get() are not retried because they are also used for broadcasts.
+
+HIVE_ENGINE_NODES = parse_urls(os.environ.get('HIVE_ENGINE_NODES', '') or
+                               os.environ.get('HIVE_ENGINE_API', "https://api.hive-engine.com/rpc/contracts"))
+HIVE_ENGINE_API = HIVE_ENGINE_NODES[0]
+
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Seconds to wait on a read before hedging it when the node has no latency history yet
+HEDGE_AFTER = float(os.environ.get('RPC_HEDGE_AFTER', '0.5'))
+
+
+UPSTREAM_LATENCY = metrics.histogram('peakedex_upstream_request_duration_seconds',
+                                     'Upstream JSON-RPC latency by method and host', ('method', 'host'))
+UPSTREAM_ERRORS = metrics.counter('peakedex_upstream_request_errors_total',
+                                  'Upstream JSON-RPC calls that failed (network, HTTP or decode errors)',
+                                  ('method', 'host'))
+
+
+class JsonRpcError(Exception):
+    """JSON-RPC error returned by a node"""
+
+
+class HiveEngineError(JsonRpcError):
+    """JSON-RPC error returned by Hive Engine"""
+
+
+class JsonRpcClient:
+    error_class = JsonRpcError
+
+    def __init__(self, urls, timeout=DEFAULT_TIMEOUT, retries=2, backoff=0.25,
+                 pool_size=16, max_per_host=8, hedge_after=HEDGE_AFTER):
+        self.nodes = urls if isinstance(urls, EndpointRegistry) else EndpointRegistry(
+            parse_urls(urls) if isinstance(urls, str) else urls)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_per_host = max_per_host
+        self.hedge_after = hedge_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._host_limits = {}
+        self._host_limits_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._hedges = ThreadPoolExecutor(max_workers=pool_size)
+
+    @property
+    def url(self):
+        """The node calls currently go to first"""
+        return self.nodes.ranked()[0].url
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            with self._host_limits_lock:
+                limit = self._host_limits.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        return limit
+
+    def request(self, method, url, timeout=None, **kwargs):
+        with self._host_limit(url):
+            return self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def _post_to(self, endpoint, payload):
+        """POST a JSON-RPC payload to one node and record how it went"""
+        started = time.monotonic()
+        ok = False
+        try:
+            r = self.post(endpoint.url, json=payload)
+            r.raise_for_status()
+            data = r.json()
+            ok = True
+            return data
+        finally:
+            elapsed = time.monotonic() - started
+            self.nodes.record(endpoint, ok, elapsed)
+            method = payload['method'] if isinstance(payload, dict) else 'batch'
+            UPSTREAM_LATENCY.observe(elapsed, method, endpoint.host)
+            if not ok:
+                UPSTREAM_ERRORS.inc(method, endpoint.host)
+
+    def _hedged(self, endpoints, payload):
+        """Ask the best node; if it is slower than its usual p90, also ask the runner-up"""
+        primary, backup = endpoints[0], endpoints[1]
+        delay = primary.latency(0.9)
+        delay = self.hedge_after if delay is None else max(0.05, delay)
+        first = self._hedges.submit(self._post_to, primary, payload)
+        done, _ = wait([first], timeout=delay)
+        if done and first.exception() is None:
+            return first.result()
+        if done:
+            # Primary failed fast: the runner-up is a plain failover
+            return self._post_to(backup, payload)
+        second = self._hedges.submit(self._post_to, backup, payload)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _send(self, payload, hedge):
+        attempt = 0
+        while True:
+            endpoints = self.nodes.ranked(probe=True)
+            try:
+                if hedge and len(endpoints) > 1:
+                    return self._hedged(endpoints, payload)
+                return self._post_to(endpoints[0], payload)
+            except (requests.RequestException, ValueError):
+                if attempt >= self.retries:
+                    raise
+                # The failure was recorded, so the next attempt prefers another node.
+                # Full jitter keeps retries from many workers from lining up
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+                attempt += 1
+
+    def call(self, method, params, hedge=True):
+        """Send one JSON-RPC request and return its result.
+
+        Pass hedge=False for calls that must not be sent to two nodes at once.
+        """
+        payload = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+        data = self._send(payload, hedge)
+        if data.get('error'):
+            raise self.error_class(data['error'])
+        return data.get('result')
+
+    def batch(self, calls):
+        """Send [(method, params), ...] as one JSON-RPC batch array.
+
+        Returns the results in call order; an entry that came back with an
+        error (or not at all) is None.
+        """
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        data = self._send(payload, hedge=True)
+        if isinstance(data, dict):
+            raise self.error_class(data.get('error') or 'Batch request not supported')
+        by_id = {item.get('id'): item for item in data}
+        results = []
+        for i in range(len(calls)):
+            item = by_id.get(i) or {}
+            results.append(None if item.get('error') else item.get('result'))
+        return results
+
+
+class HiveEngineClient(JsonRpcClient):
+    """JSON-RPC client for the Hive Engine contracts API"""
+
+    error_class = HiveEngineError
+
+    def __init__(self, urls=HIVE_ENGINE_NODES, **kwargs):
+        super().__init__(urls, **kwargs)
+
+    def find(self, contract, table, query, limit=1000, offset=0, indexes=None):
+        params = {
+            "contract": contract,
+            "table": table,
+            "query": query,
+            "limit": limit,
+            "offset": offset,
+        }
+        if indexes:
+            params["indexes"] = indexes
+        return self.call("find", params) or []
+
+    def find_all(self, contract, table, query, page_size=1000, max_rows=100000, indexes=None):
+        """find() that follows offsets until a short page (or max_rows) is reached"""
+        rows = []
+        while len(rows) < max_rows:
+            page = self.find(contract, table, query, limit=page_size, offset=len(rows), indexes=indexes)
+            rows.extend(page)
+            if len(page) < page_size:
+                break
+        return rows
+
+    def find_one(self, contract, table, query):
+        return self.call("findOne", {"contract": contract, "table": table, "query": query})
+
+    def get_order_book(self, symbol, limit=50):
+        return self.call("getOrderBook", {"symbol": symbol, "limit": limit})
+
+
+# Shared instance used by app.py and price_fetcher.py
+client = HiveEngineClient()
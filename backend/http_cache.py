@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+# HTTP caching for the JSON read endpoints.
+# A Payload is one encoded JSON body with its content-hash ETag; compressed
+# variants are produced on first request and kept, so the hash and each
+# compression run once per payload, not once per request. PayloadMemo keeps
+# payloads per request shape together with the version of the data they were
+# built from (an upstream cache object, a max id...), and rebuilds only when
+# the version changes. respond() answers If-None-Match with 304 and
+# negotiates gzip/brotli for bodies over COMPRESS_MIN_SIZE bytes.
+
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _compress(encoding, body):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class Payload:
+    __slots__ = ('body', 'etag', '_encoded')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._encoded = {}
+
+    @classmethod
+    def json(cls, value):
+        return cls(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+    def encoded(self, encoding):
+        """Body in the given content coding (None for identity), compressed at most once"""
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = _compress(encoding, self.body)
+        return data
+
+
+class PayloadMemo:
+    """Payloads keyed by request shape, rebuilt only when the data version changes"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """Payload for key; build() returns the JSON value and is called only on a version change"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        payload = Payload.json(build())
+        with self._lock:
+            self._entries[key] = (version, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def stats(self):
+        # Same shape as MarketDataCache.stats(), for the cache metrics
+        with self._lock:
+            return {'hits': self.hits, 'stale_hits': 0, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(size):
+    if size < COMPRESS_MIN_SIZE:
+        return None
+    accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _etag_matches(header, etag):
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        # Weak comparison; compressed variants carry a -gzip/-br suffix
+        candidate = candidate.removeprefix('W/').strip('"')
+        if candidate.split('-', 1)[0] == etag:
+            return True
+    return False
+
+
+def respond(payload, cache_control):
+    """200 with the (possibly compressed) payload, or 304 if the client's ETag still matches"""
+    encoding = negotiate_encoding(len(payload.body))
+    etag = f'"{payload.etag}-{encoding}"' if encoding else f'"{payload.etag}"'
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if _etag_matches(request.headers.get('If-None-Match', ''), payload.etag):
+        return Response(status=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(payload.encoded(encoding), content_type='application/json', headers=headers)
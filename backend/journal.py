@@ -0,0 +1,214 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, assume a single process
+    fcntl = None
+
+# Append-only change journal for the FTP order backup.
+# Triggers on the orders table record every insert/update/delete with a
+# monotonic sequence number. Each upload ships only the orders changed since
+# the last uploaded sequence, as a gzip-compressed NDJSON segment, and every
+# `snapshot_every` segments a compacted full snapshot replaces them. A small
+# manifest on the FTP server lists the current snapshot and the segments
+# after it, so a restore loads the snapshot and replays the segments in order.
+# Uploads and erases hold an exclusive flock on `lock_path`, because the
+# leader's uploader and a manual /api/ftp/upload on another worker would
+# otherwise write segments and the manifest at the same time.
+#
+# Remote files:
+#   orders-manifest.json
+#   orders-snapshot-<seq>.ndjson.gz
+#   orders-segment-<from>-<to>.ndjson.gz
+
+MANIFEST_FILE = 'orders-manifest.json'
+
+# Downloads larger than this are spooled to disk instead of held in memory
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+JOURNAL_SQL = [
+    '''CREATE TABLE IF NOT EXISTS order_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        op TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS journal_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS orders_journal_insert AFTER INSERT ON orders
+       BEGIN INSERT INTO order_journal (order_id, op) VALUES (NEW.id, 'upsert'); END''',
+    '''CREATE TRIGGER IF NOT EXISTS orders_journal_update AFTER UPDATE ON orders
+       BEGIN INSERT INTO order_journal (order_id, op) VALUES (NEW.id, 'upsert'); END''',
+    '''CREATE TRIGGER IF NOT EXISTS orders_journal_delete AFTER DELETE ON orders
+       BEGIN INSERT INTO order_journal (order_id, op) VALUES (OLD.id, 'delete'); END''',
+]
+
+
+def encode_ndjson_gz(records):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+        for record in records:
+            gz.write(json.dumps(record, separators=(',', ':')).encode('utf-8'))
+            gz.write(b'\n')
+    return buf.getvalue()
+
+
+def decode_ndjson_gz(data):
+    """Yield records from gzip NDJSON given as bytes or a binary file object"""
+    fileobj = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    with gzip.GzipFile(fileobj=fileobj, mode='rb') as gz:
+        for line in gz:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _retrieve(ftp, name):
+    buf = io.BytesIO()
+    ftp.retrbinary(f'RETR {name}', buf.write)
+    return buf.getvalue()
+
+
+def retrieve_to_file(ftp, name, max_memory=SPOOL_MAX_MEMORY):
+    """Download a remote file into a temp file (spilled to disk past max_memory), rewound"""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    ftp.retrbinary(f'RETR {name}', spool.write)
+    spool.seek(0)
+    return spool
+
+
+class OrderJournal:
+    def __init__(self, db, row_to_dict, snapshot_every=50, lock_path=None):
+        self.db = db
+        self.row_to_dict = row_to_dict
+        self.snapshot_every = snapshot_every
+        self.lock_path = lock_path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self):
+        """Held while the remote backup is written: across threads, and across processes via flock"""
+        with self._lock:
+            if self.lock_path is None or fcntl is None:
+                yield
+                return
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def init_db(self):
+        with self.db.connection() as conn:
+            for sql in JOURNAL_SQL:
+                conn.execute(sql)
+            conn.commit()
+
+    def _load_state(self, conn):
+        state = {'uploaded_seq': 0, 'manifest': None}
+        for key, value in conn.execute('SELECT key, value FROM journal_state'):
+            state[key] = json.loads(value)
+        return state
+
+    def _save_state(self, conn, state):
+        conn.executemany('INSERT OR REPLACE INTO journal_state (key, value) VALUES (?, ?)',
+                         [(k, json.dumps(v)) for k, v in state.items()])
+
+    def _snapshot_records(self, conn, seq):
+        for row in conn.execute('SELECT * FROM orders ORDER BY id'):
+            yield {'seq': seq, 'op': 'upsert', 'order': self.row_to_dict(row)}
+
+    def _segment_records(self, conn, after_seq, to_seq):
+        # Latest state of every order touched in (after_seq, to_seq]; replay is idempotent
+        changes = conn.execute('''SELECT order_id, MAX(seq), op FROM order_journal
+                                  WHERE seq > ? AND seq <= ? GROUP BY order_id ORDER BY MAX(seq)''',
+                               (after_seq, to_seq)).fetchall()
+        for order_id, seq, op in changes:
+            row = conn.execute('SELECT * FROM orders WHERE id = ?', (order_id,)).fetchone()
+            if row is None:
+                yield {'seq': seq, 'op': 'delete', 'order': {'id': order_id}}
+            else:
+                yield {'seq': seq, 'op': 'upsert', 'order': self.row_to_dict(row)}
+
+    def backlog(self):
+        """Journal entries not yet in the FTP backup; read from the database, so any process sees it"""
+        with self.db.connection() as conn:
+            max_seq = conn.execute('SELECT MAX(seq) FROM order_journal').fetchone()[0]
+            row = conn.execute("SELECT value FROM journal_state WHERE key = 'uploaded_seq'").fetchone()
+        uploaded = json.loads(row[0]) if row else 0
+        return max(0, (max_seq or uploaded) - uploaded)
+
+    def upload(self, ftp):
+        """Ship journal changes since the last upload; returns a status message"""
+        with self._exclusive(), self.db.connection() as conn:
+            state = self._load_state(conn)
+            manifest = state['manifest']
+            max_seq = conn.execute('SELECT MAX(seq) FROM order_journal').fetchone()[0] or state['uploaded_seq']
+            if manifest is not None and max_seq <= state['uploaded_seq']:
+                return 'Backup already up to date.'
+            stale_files = []
+            if manifest is None or len(manifest['segments']) >= self.snapshot_every:
+                name = f'orders-snapshot-{max_seq:012d}.ndjson.gz'
+                ftp.storbinary(f'STOR {name}', io.BytesIO(encode_ndjson_gz(self._snapshot_records(conn, max_seq))))
+                if manifest is not None:
+                    stale_files = [manifest['snapshot']['file']] + [s['file'] for s in manifest['segments']]
+                manifest = {'version': 1, 'snapshot': {'file': name, 'seq': max_seq}, 'segments': []}
+                message = f'Uploaded snapshot at seq {max_seq}.'
+            else:
+                after = state['uploaded_seq']
+                name = f'orders-segment-{after + 1:012d}-{max_seq:012d}.ndjson.gz'
+                ftp.storbinary(f'STOR {name}', io.BytesIO(encode_ndjson_gz(self._segment_records(conn, after, max_seq))))
+                manifest['segments'].append({'file': name, 'from': after + 1, 'to': max_seq})
+                message = f'Uploaded segment {after + 1}-{max_seq}.'
+            # The manifest is written last, so a failed upload never references missing files
+            ftp.storbinary(f'STOR {MANIFEST_FILE}', io.BytesIO(json.dumps(manifest).encode('utf-8')))
+            if not manifest['segments']:
+                # Everything up to the snapshot is now in the snapshot itself
+                conn.execute('DELETE FROM order_journal WHERE seq <= ?', (max_seq,))
+            self._save_state(conn, {'uploaded_seq': max_seq, 'manifest': manifest})
+            conn.commit()
+        for name in stale_files:
+            try:
+                ftp.delete(name)
+            except Exception as e:
+                print(f"Could not delete old backup file {name}: {e}")
+        return message
+
+    def read_remote(self, ftp):
+        """Yield journal records (snapshot, then segments) from the FTP backup.
+
+        Returns None when the server has no journal manifest.
+        """
+        try:
+            manifest = json.loads(_retrieve(ftp, MANIFEST_FILE).decode('utf-8'))
+        except Exception:
+            return None
+        files = [manifest['snapshot']['file']] + [s['file'] for s in manifest['segments']]
+        def records():
+            for name in files:
+                with retrieve_to_file(ftp, name) as f:
+                    yield from decode_ndjson_gz(f)
+        return records()
+
+    def erase_remote(self, ftp):
+        """Delete the manifest and every file it lists; returns the names deleted"""
+        with self._exclusive():
+            try:
+                manifest = json.loads(_retrieve(ftp, MANIFEST_FILE).decode('utf-8'))
+            except Exception:
+                return []
+            files = [MANIFEST_FILE, manifest['snapshot']['file']] + [s['file'] for s in manifest['segments']]
+            for name in files:
+                ftp.delete(name)
+            with self.db.connection() as conn:
+                # The next upload starts over with a fresh snapshot
+                conn.execute('DELETE FROM journal_state')
+                conn.commit()
+        return files
@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, assume a single process
+    fcntl = None
+
+# Leader election between worker processes sharing one orders.db.
+# The leader holds an exclusive flock on a lock file for as long as it
+# lives; the OS drops the lock when the process exits, so another worker
+# polling for it takes over. Only the leader runs the matcher, the FTP
+# replicator and the other background writers.
+
+
+class LeaderElection:
+    def __init__(self, path, retry_interval=5.0):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._fd = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take the lock without blocking; True if this process is (now) the leader"""
+        if self._fd is not None or fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # For operators: which process currently leads
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def start(self, on_elected):
+        """Run on_elected() once this process wins; keeps retrying in the background until it does"""
+        with self._lock:
+            if self._thread is not None or self.is_leader:
+                return
+            if self.try_acquire():
+                self._elected(on_elected)
+                return
+            print(f"Process {os.getpid()} is a follower; waiting for the leader lock {self.path}")
+            self._thread = threading.Thread(target=self._wait, args=(on_elected,), daemon=True)
+            self._thread.start()
+
+    def _wait(self, on_elected):
+        while not self.try_acquire():
+            time.sleep(self.retry_interval)
+        self._elected(on_elected)
+
+    def _elected(self, on_elected):
+        self.is_leader = True
+        print(f"Process {os.getpid()} elected leader")
+        on_elected()
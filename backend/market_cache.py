@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Shared TTL cache for upstream market data.
+# - Fresh entries (younger than ttl) are returned directly.
+# - Stale entries (younger than stale_ttl) are returned immediately while one
+#   background refresh runs (stale-while-revalidate).
+# - Concurrent misses for the same key wait on a single upstream call
+#   (single-flight) instead of each hitting Hive Engine.
+# - Size is bounded; the least recently used entry is evicted first.
+# - Optionally, a loader result of None is kept for negative_ttl seconds
+#   (negative caching) and never served stale.
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'ttl', 'stale_ttl')
+
+    def __init__(self, value, fetched_at, ttl, stale_ttl):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MarketDataCache:
+    def __init__(self, ttl=2.0, stale_ttl=30.0, max_entries=512, negative_ttl=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() when it is missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < entry.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                if age < entry.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._flights:
+                        self._flights[key] = _Flight()
+                        threading.Thread(target=self._load, args=(key, loader), daemon=True).start()
+                    return entry.value
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if leader:
+            self._load(key, loader)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, key, loader):
+        with self._lock:
+            flight = self._flights[key]
+        try:
+            value = loader()
+        except Exception as e:
+            flight.error = e
+        else:
+            flight.value = value
+            if value is None and self.negative_ttl is not None:
+                entry = _Entry(value, time.monotonic(), self.negative_ttl, self.negative_ttl)
+            else:
+                entry = _Entry(value, time.monotonic(), self.ttl, self.stale_ttl)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,114 @@
+import heapq
+import threading
+from collections import deque
+
+# In-memory price-time-priority order book.
+# Each side keeps a dict of price -> FIFO queue of resting orders plus a heap of
+# price levels, so the best bid/ask is found in O(1) and a new level costs O(log n).
+# SQLite stays the durable record; the book is rebuilt from it on startup.
+
+
+class Order:
+    __slots__ = ('id', 'username', 'side', 'price', 'amount', 'created_at')
+
+    def __init__(self, id, username, side, price, amount, created_at=None):
+        self.id = id
+        self.username = username
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.created_at = created_at
+
+    def __repr__(self):
+        return f"Order(id={self.id}, side={self.side}, price={self.price}, amount={self.amount})"
+
+
+class OrderBook:
+    def __init__(self, base, quote, dust=0):
+        self.base = base
+        self.quote = quote
+        # Remaining amounts at or below dust count as filled
+        self.dust = dust
+        self.lock = threading.RLock()
+        self._levels = {'buy': {}, 'sell': {}}
+        # Bids are stored negated so both heaps pop the best price first
+        self._prices = {'buy': [], 'sell': []}
+        # Ids of resting orders, so an order reaching the book twice rests once
+        self._ids = set()
+
+    def __len__(self):
+        return sum(len(q) for side in self._levels.values() for q in side.values())
+
+    def count(self, side):
+        """Number of resting orders on one side"""
+        return sum(len(q) for q in self._levels[side].values())
+
+    def clear(self):
+        self._levels = {'buy': {}, 'sell': {}}
+        self._prices = {'buy': [], 'sell': []}
+        self._ids = set()
+
+    def add(self, order):
+        """Rest an order; returns False if an order with this id is already in the book"""
+        if order.id in self._ids:
+            return False
+        self._ids.add(order.id)
+        levels = self._levels[order.side]
+        queue = levels.get(order.price)
+        if queue is None:
+            queue = levels[order.price] = deque()
+            key = -order.price if order.side == 'buy' else order.price
+            heapq.heappush(self._prices[order.side], key)
+        queue.append(order)
+        return True
+
+    def _best_level(self, side):
+        prices = self._prices[side]
+        levels = self._levels[side]
+        # Drop levels emptied by fills (lazy deletion)
+        while prices:
+            price = -prices[0] if side == 'buy' else prices[0]
+            if price in levels:
+                return levels[price]
+            heapq.heappop(prices)
+        return None
+
+    def best_bid(self):
+        level = self._best_level('buy')
+        return level[0] if level else None
+
+    def best_ask(self):
+        level = self._best_level('sell')
+        return level[0] if level else None
+
+    def next_match(self):
+        """Return (buy, sell, price, amount) for the next crossing pair, or None.
+
+        The book is not modified; call apply_fill() once the trade went through.
+        """
+        buy = self.best_bid()
+        sell = self.best_ask()
+        if buy is None or sell is None or buy.price < sell.price:
+            return None
+        # Always at the sell order's price, whichever side arrived first (the original SQL matcher's rule)
+        return buy, sell, sell.price, min(buy.amount, sell.amount)
+
+    def apply_fill(self, buy, sell, amount):
+        for order in (buy, sell):
+            order.amount -= amount
+            if order.amount <= self.dust:
+                self._pop_head(order)
+
+    def _pop_head(self, order):
+        levels = self._levels[order.side]
+        queue = levels[order.price]
+        queue.popleft()
+        self._ids.discard(order.id)
+        if not queue:
+            del levels[order.price]
+
+    def depth(self, side):
+        """Aggregated [(price, amount), ...] for one side, best price first."""
+        levels = self._levels[side]
+        prices = sorted(levels, reverse=(side == 'buy'))
+        return [(p, sum(o.amount for o in levels[p])) for p in prices]
@@ -1,54 +1,203 @@
-import requests
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation, localcontext
+
+from hive_engine import client as hive_engine
+
+# Pricing engine.
+# Every Hive Engine market is quoted in SWAP.HIVE, and market.metrics holds
+# one row per token with its last price, best bid and best ask. The whole
+# table is pulled in one paged find and kept as an in-memory snapshot,
+# refreshed in the background every PRICE_REFRESH_INTERVAL seconds. The
+# sources are fetched concurrently (each Hive Engine call is also hedged
+# across nodes by the client); for each token the first source in priority
+# order that has it wins.
+#
+# A pair quoted in anything other than SWAP.HIVE is triangulated through it:
+#   PEK/SWAP.BTC = (PEK/SWAP.HIVE) / (SWAP.BTC/SWAP.HIVE)
+# A snapshot older than PRICE_MAX_AGE seconds is never served.
 
-HIVE_ENGINE_API = "https://api.hive-engine.com/rpc/contracts"
 NECTAR_ENGINE_API = "https://api.nectar.engine/market/ticker"  # Example, update if needed
 
-# Fetch price from Hive Engine market
-# Returns price as string or None
-
-def get_price_hive_engine(base_symbol, quote_symbol):
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "find",
-        "params": {
-            "contract": "market",
-            "table": "metrics",
-            "query": {"symbol": base_symbol}
-        }
-    }
+HUB = 'SWAP.HIVE'
+PRICE_REFRESH_INTERVAL = float(os.environ.get('PRICE_REFRESH_INTERVAL', '10'))
+PRICE_MAX_AGE = float(os.environ.get('PRICE_MAX_AGE', '60'))
+PRICE_SOURCE_TIMEOUT = float(os.environ.get('PRICE_SOURCE_TIMEOUT', '5'))
+# Significant digits kept when dividing one price by another
+PRICE_PRECISION = 12
+
+
+class StalePriceError(Exception):
+    """No snapshot younger than the staleness bound is available"""
+
+
+def _decimal(value):
     try:
-        r = requests.post(HIVE_ENGINE_API, json=payload, timeout=10)
-        data = r.json()
-        if 'result' in data and data['result']:
-            metrics = data['result'][0]
-            if quote_symbol == 'SWAP.HIVE':
-                return metrics.get('lastPrice')
-            # Add more quote logic if needed
-        return None
-    except Exception as e:
-        print(f"Error fetching price from Hive Engine: {e}")
+        d = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
         return None
+    return d if d.is_finite() and d > 0 else None
+
+
+def _format(value):
+    return format(value.normalize(), 'f') if value is not None else None
+
+
+# --- sources: each returns {token: {'last', 'bid', 'ask'}} priced in SWAP.HIVE ---
+
+def fetch_hive_engine_metrics():
+    rows = hive_engine.find_all('market', 'metrics', {})
+    prices = {}
+    for row in rows:
+        prices[row.get('symbol')] = {
+            'last': _decimal(row.get('lastPrice')),
+            'bid': _decimal(row.get('highestBid')),
+            'ask': _decimal(row.get('lowestAsk')),
+        }
+    return prices
 
 # Placeholder for Nectar Engine (update endpoint/logic as needed)
-def get_price_nectar_engine(base_symbol, quote_symbol):
-    try:
-        r = requests.get(NECTAR_ENGINE_API, timeout=10)
-        data = r.json()
-        # Example: data might be a dict of pairs
-        pair = f"{base_symbol}_{quote_symbol}"
-        if pair in data:
-            return data[pair]['last']
-        return None
-    except Exception as e:
-        print(f"Error fetching price from Nectar Engine: {e}")
-        return None
+def fetch_nectar_engine():
+    r = hive_engine.get(NECTAR_ENGINE_API)
+    r.raise_for_status()
+    data = r.json()
+    # Example: data might be a dict of pairs keyed BASE_QUOTE
+    prices = {}
+    suffix = f"_{HUB}"
+    for pair, ticker in data.items():
+        if pair.endswith(suffix):
+            prices[pair[:-len(suffix)]] = {'last': _decimal(ticker.get('last')), 'bid': None, 'ask': None}
+    return prices
+
+# Priority order
+PRICE_SOURCES = [
+    ('hive-engine', fetch_hive_engine_metrics),
+    ('nectar', fetch_nectar_engine),
+]
+
+
+class PriceEngine:
+    def __init__(self, sources=PRICE_SOURCES, interval=PRICE_REFRESH_INTERVAL,
+                 max_age=PRICE_MAX_AGE, source_timeout=PRICE_SOURCE_TIMEOUT):
+        self.sources = sources
+        self.interval = interval
+        self.max_age = max_age
+        self.source_timeout = source_timeout
+        self.refreshes = 0
+        self.errors = {}
+        self._snapshot = None  # (prices, monotonic time, wall time)
+        self._pool = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='price-source')
+        self._lock = threading.Lock()
+        self._thread = None
 
-# Main function to get price, tries Hive Engine first, then Nectar
+    def refresh(self):
+        """Fetch every source at once and swap in a new snapshot; False if all sources failed"""
+        futures = {self._pool.submit(fetch): name for name, fetch in self.sources}
+        done, _ = wait(futures, timeout=self.source_timeout)
+        results, errors = {}, {}
+        for future, name in futures.items():
+            if future not in done:
+                errors[name] = f'timed out after {self.source_timeout}s'
+            elif future.exception() is not None:
+                errors[name] = str(future.exception())
+            else:
+                results[name] = future.result()
+        self.errors = errors
+        if not results:
+            print(f"Price refresh failed: {errors}")
+            return False
+        prices = {}
+        for name, _ in reversed(self.sources):
+            for token, price in results.get(name, {}).items():
+                if price.get('last') or price.get('bid') or price.get('ask'):
+                    prices[token] = dict(price, source=name)
+        prices[HUB] = {'last': Decimal(1), 'bid': Decimal(1), 'ask': Decimal(1), 'source': 'unit'}
+        self._snapshot = (prices, time.monotonic(), time.time())
+        self.refreshes += 1
+        return True
 
+    def start(self):
+        """Start the background refresher (once)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            def run():
+                while True:
+                    time.sleep(self.interval)
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        print(f"Price refresh error: {e}")
+            self._thread = threading.Thread(target=run, daemon=True)
+            self._thread.start()
+
+    def age(self):
+        snapshot = self._snapshot
+        return time.monotonic() - snapshot[1] if snapshot else None
+
+    def snapshot(self):
+        """The current snapshot, fetching the first one on demand; raises StalePriceError past max_age"""
+        if self._snapshot is None:
+            self.start()
+            with self._lock:
+                if self._snapshot is None:
+                    self.refresh()
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot[1] > self.max_age:
+            raise StalePriceError(f"No price data newer than {self.max_age:g}s ({self.errors or 'no refresh yet'})")
+        return snapshot
+
+    def price(self, base, quote):
+        """Last/bid/ask for base in quote, directly or via SWAP.HIVE; None if either leg is unknown"""
+        prices, refreshed, updated_at = self.snapshot()
+        base_leg, quote_leg = prices.get(base), prices.get(quote)
+        if base_leg is None or quote_leg is None:
+            return None
+        with localcontext() as ctx:
+            ctx.prec = PRICE_PRECISION
+            def ratio(numerator, denominator):
+                return numerator / denominator if numerator and denominator else None
+            # Selling base for quote: sell base at its bid, buy quote at its ask
+            last = ratio(base_leg['last'], quote_leg['last'])
+            bid = ratio(base_leg['bid'], quote_leg['ask'])
+            ask = ratio(base_leg['ask'], quote_leg['bid'])
+        if last is None and bid is None and ask is None:
+            return None
+        return {
+            'base': base,
+            'quote': quote,
+            'price': _format(last if last is not None else (ask or bid)),
+            'bid': _format(bid),
+            'ask': _format(ask),
+            'route': 'direct' if quote == HUB else f'via {HUB}',
+            'sources': sorted({base_leg['source'], quote_leg['source']} - {'unit'}),
+            'updated_at': int(updated_at),
+            'age_seconds': round(time.monotonic() - refreshed, 3),
+            'max_age_seconds': self.max_age,
+        }
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'tokens': len(snapshot[0]) if snapshot else 0,
+            'age_seconds': round(self.age(), 3) if snapshot else None,
+            'refresh_interval': self.interval,
+            'max_age_seconds': self.max_age,
+            'refreshes': self.refreshes,
+            'errors': dict(self.errors),
+        }
+
+
+# Shared instance; it starts refreshing on first use
+engine = PriceEngine()
+
+# Main function to get price: last price of base in quote, as a string, or None
 def get_best_price(base_symbol, quote_symbol):
-    price = get_price_hive_engine(base_symbol, quote_symbol)
-    if price:
-        return price
-    price = get_price_nectar_engine(base_symbol, quote_symbol)
-    return price
+    try:
+        result = engine.price(base_symbol, quote_symbol)
+    except StalePriceError as e:
+        print(f"Error fetching price: {e}")
+        return None
+    return result['price'] if result else None
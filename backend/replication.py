@@ -0,0 +1,102 @@
+import threading
+import time
+
+# Coalescing background uploader for the FTP order backup.
+# Writers only call mark_dirty(), which sets a flag and returns; one worker
+# thread waits until writes have been quiet for `debounce` seconds (or the
+# oldest unsaved write is `max_latency` seconds old) and then runs a single
+# upload covering everything written so far. Failed uploads are retried with
+# exponential backoff, so a dead FTP host costs one attempt per backoff
+# period no matter how many orders arrive.
+#
+# Backpressure is not applied here: mark_dirty() runs on the leader, while
+# orders are placed through every worker. The order endpoints check the
+# journal backlog in the database instead (see FTP_BACKUP_MAX_BACKLOG).
+
+
+class SnapshotUploader:
+    def __init__(self, upload, debounce=5.0, max_latency=30.0, retry_backoff=5.0, max_backoff=300.0):
+        # upload() must raise on failure
+        self.upload = upload
+        self.debounce = debounce
+        self.max_latency = max_latency
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._dirty_since = None
+        self._last_write = None
+        self._thread = None
+        self.uploads = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_upload_at = None
+        self.last_duration = None
+
+    def mark_dirty(self):
+        """Record that the orders table changed; never blocks on the upload"""
+        now = time.monotonic()
+        with self._cond:
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_write = now
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _wait_for_window(self):
+        """Block until there is something to upload and the debounce window has closed"""
+        with self._cond:
+            while True:
+                if self._dirty_since is None:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                due = min(self._last_write + self.debounce, self._dirty_since + self.max_latency)
+                if now >= due:
+                    dirty_since = self._dirty_since
+                    # Writes that land during the upload mark the snapshot dirty again
+                    self._dirty_since = self._last_write = None
+                    return dirty_since
+                self._cond.wait(due - now)
+
+    def _run(self):
+        while True:
+            dirty_since = self._wait_for_window()
+            started = time.monotonic()
+            try:
+                self.upload()
+            except Exception as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+                print(f"Order backup upload failed: {e}")
+                with self._cond:
+                    # Keep the original dirty time so lag keeps growing while failing
+                    if self._dirty_since is None or dirty_since < self._dirty_since:
+                        self._dirty_since = dirty_since
+                    self._last_write = self._last_write or dirty_since
+                time.sleep(min(self.max_backoff, self.retry_backoff * (2 ** (self.consecutive_failures - 1))))
+                continue
+            self.last_duration = time.monotonic() - started
+            self.last_upload_at = time.time()
+            self.uploads += 1
+            self.consecutive_failures = 0
+            self.last_error = None
+
+    def status(self):
+        with self._cond:
+            dirty_since = self._dirty_since
+        return {
+            'dirty': dirty_since is not None,
+            'lag_seconds': round(time.monotonic() - dirty_since, 3) if dirty_since is not None else 0,
+            'uploads': self.uploads,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'last_upload_at': self.last_upload_at,
+            'last_duration_seconds': self.last_duration,
+        }
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+# Startup timing and readiness.
+# Phases are timestamps in seconds since the process started (read from
+# /proc where available, so interpreter and server boot are included).
+# Tasks are the background startup jobs; the process is ready once all of
+# them have finished, whether or not they succeeded.
+
+
+def process_age():
+    """Seconds since this process started, or None if the OS does not say"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTracker:
+    def __init__(self):
+        age = process_age()
+        # Monotonic clock reading at process start
+        self._zero = time.monotonic() - (age if age is not None else 0)
+        self.phases = {}
+        self.tasks = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self._zero
+
+    def mark(self, phase):
+        """Record the first time a phase is reached"""
+        with self._lock:
+            if phase not in self.phases:
+                self.phases[phase] = round(self.elapsed(), 3)
+
+    def expect(self, *names):
+        """Register tasks up front, so readiness waits for tasks that have not started yet"""
+        with self._lock:
+            for name in names:
+                self.tasks.setdefault(name, {'state': 'pending'})
+
+    def run(self, name, fn, *args):
+        """Run fn as task `name`, recording its outcome and duration; returns fn's result or None"""
+        started = time.monotonic()
+        with self._lock:
+            self.tasks[name] = {'state': 'running'}
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"Startup task {name} failed: {e}")
+            state, result = {'state': 'failed', 'error': str(e)}, None
+        else:
+            state = {'state': 'done'}
+        state['seconds'] = round(time.monotonic() - started, 3)
+        with self._lock:
+            self.tasks[name] = state
+        self.mark(name)
+        return result
+
+    def ready(self):
+        with self._lock:
+            return all(task['state'] in ('done', 'failed') for task in self.tasks.values())
+
+    def status(self):
+        with self._lock:
+            return {
+                'ready': all(task['state'] in ('done', 'failed') for task in self.tasks.values()),
+                'uptime_seconds': round(self.elapsed(), 3),
+                'phases': dict(self.phases),
+                'tasks': {name: dict(task) for name, task in self.tasks.items()},
+            }
@@ -0,0 +1,153 @@
+import itertools
+import queue
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+# Server-push feed of order book and trade updates for one pair.
+# A single poller thread per pair reads the (cached) upstream book and trades,
+# diffs them against the previous poll and fans the changes out to every
+# subscriber queue. Upstream load is therefore one poll per pair per interval,
+# however many browsers are connected. Every event carries a sequence number;
+# a subscriber that falls too far behind is dropped and must reconnect to get a
+# fresh snapshot. Upstream fetches run outside the subscriber lock (one at a
+# time per pair), so a slow Hive Engine never blocks subscribe/unsubscribe.
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def _aggregate_levels(orders):
+    """Sum quantities per price: {price: quantity} as decimal strings"""
+    levels = {}
+    for order in orders or []:
+        try:
+            price = Decimal(str(order['price']))
+            quantity = Decimal(str(order.get('quantity', '0')))
+        except (KeyError, InvalidOperation):
+            continue
+        levels[price] = levels.get(price, Decimal(0)) + quantity
+    return {str(p): str(q) for p, q in levels.items()}
+
+
+def _level_changes(old, new):
+    """[[price, quantity], ...] for levels that changed; quantity '0' removes a level"""
+    changes = [[price, qty] for price, qty in new.items() if old.get(price) != qty]
+    changes.extend([price, '0'] for price in old if price not in new)
+    return changes
+
+
+def _trade_key(trade):
+    return trade.get('_id') or (trade.get('txId'), trade.get('timestamp'), trade.get('price'), trade.get('quantity'))
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = False
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+
+class PairFeed:
+    def __init__(self, base, quote, fetch_book, fetch_trades, interval=1.0):
+        self.base = base
+        self.quote = quote
+        self.fetch_book = fetch_book
+        self.fetch_trades = fetch_trades
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Serializes fetch+apply, so polls are applied in the order they were fetched
+        self._fetch_lock = threading.Lock()
+        self._subscribers = set()
+        self._seq = itertools.count(1)
+        self.seq = 0
+        self._bids = {}
+        self._asks = {}
+        self._trades = []
+        self._trade_keys = set()
+        self._primed = False
+        self._thread = None
+
+    def subscribe(self):
+        """Register a subscriber; its first event is a full snapshot"""
+        sub = Subscriber()
+        if not self._primed:
+            self._poll()
+        with self._lock:
+            sub.queue.put(self._snapshot_locked())
+            self._subscribers.add(sub)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _snapshot_locked(self):
+        return {
+            'type': 'snapshot',
+            'seq': self.seq,
+            'base': self.base,
+            'quote': self.quote,
+            'bids': sorted(([p, q] for p, q in self._bids.items()), key=lambda l: Decimal(l[0]), reverse=True),
+            'asks': sorted(([p, q] for p, q in self._asks.items()), key=lambda l: Decimal(l[0])),
+            'trades': list(self._trades),
+        }
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._subscribers:
+                    # Stop polling once nobody is listening; subscribe() restarts it
+                    self._thread = None
+                    return
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"Stream poll failed for {self.base}/{self.quote}: {e}")
+
+    def _poll(self):
+        with self._fetch_lock:
+            # Upstream calls; subscribers come and go meanwhile
+            book = self.fetch_book() or {}
+            trades = self.fetch_trades() or []
+            with self._lock:
+                self._apply_locked(book, trades)
+
+    def _apply_locked(self, book, trades):
+        """Diff a fetched book and trade list against the last one and publish the changes"""
+        bids = _aggregate_levels(book.get('bids'))
+        asks = _aggregate_levels(book.get('asks'))
+        # Upstream returns newest first; publish new trades oldest first
+        new_trades = [t for t in reversed(trades) if _trade_key(t) not in self._trade_keys]
+        events = []
+        if self._primed:
+            bid_changes = _level_changes(self._bids, bids)
+            ask_changes = _level_changes(self._asks, asks)
+            if bid_changes or ask_changes:
+                events.append({'type': 'book', 'bids': bid_changes, 'asks': ask_changes})
+            if new_trades:
+                events.append({'type': 'trades', 'trades': new_trades})
+        self._bids, self._asks = bids, asks
+        self._trades = list(trades)
+        self._trade_keys = {_trade_key(t) for t in trades}
+        self._primed = True
+        for event in events:
+            self.seq = event['seq'] = next(self._seq)
+            self._publish_locked(event)
+
+    def _publish_locked(self, event):
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.dropped = True
+                self._subscribers.discard(sub)
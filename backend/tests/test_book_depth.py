@@ -0,0 +1,21 @@
+from book_depth import aggregate_side
+
+
+def test_levels_are_summed_and_bucketed_conservatively():
+    bids = [{'price': '1.27', 'quantity': '1'}, {'price': '1.21', 'quantity': '2'}, {'price': '1.3', 'quantity': '4'}]
+    asks = [{'price': '1.31', 'quantity': '1'}, {'price': '1.39', 'quantity': '2'}]
+    assert aggregate_side(bids, 'bids', precision=1, cumulative=True) == [
+        {'price': '1.3', 'quantity': '4', 'total': '4'},
+        {'price': '1.2', 'quantity': '3', 'total': '7'},
+    ]
+    assert aggregate_side(asks, 'asks', precision=1, compact=True) == [['1.4', '3']]
+
+
+def test_price_too_large_for_the_tick_is_skipped():
+    orders = [{'price': '1e30', 'quantity': '1'}, {'price': '0.5', 'quantity': '2'}]
+    assert aggregate_side(orders, 'bids', precision=12) == [{'price': '0.500000000000', 'quantity': '2'}]
+
+
+def test_malformed_rows_are_skipped():
+    orders = [{'quantity': '1'}, {'price': 'abc', 'quantity': '1'}, {'price': 'NaN', 'quantity': '1'}, {'price': '2', 'quantity': '1'}]
+    assert aggregate_side(orders, 'asks') == [{'price': '2', 'quantity': '1'}]
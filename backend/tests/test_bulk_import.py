@@ -0,0 +1,126 @@
+import io
+import json
+
+import pytest
+
+import app
+import bulk_import
+from bulk_import import import_orders, iter_json_array
+from db import Database
+
+
+def order(id, **fields):
+    return dict({'id': id, 'username': 'a', 'base': 'PEK', 'quote': 'SWAP.HIVE', 'amount': '1',
+                 'price': '0.5', 'side': 'buy', 'status': 'pending', 'created_at': '2024-01-01 00:00:00'}, **fields)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'orders.db'))
+    with db.connection() as conn:
+        conn.execute(app.ORDERS_TABLE_SQL)
+        conn.commit()
+    return db
+
+
+def rows(db):
+    with db.connection() as conn:
+        return {row[0]: row[1:] for row in conn.execute('SELECT id, username, amount, status FROM orders')}
+
+
+# --- iter_json_array ---
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64 * 1024])
+def test_iter_json_array_across_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(bulk_import, 'READ_CHUNK_SIZE', chunk_size)
+    items = [{'id': i, 'note': 'x' * i} for i in range(20)]
+    text = json.dumps({'version': 2, 'orders': items, 'after': [1, 2]})
+    assert list(iter_json_array(io.BytesIO(text.encode('utf-8')), 'orders')) == items
+    assert list(iter_json_array(io.StringIO(text), 'orders')) == items
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5])
+def test_iter_json_array_multibyte_split(monkeypatch, chunk_size):
+    monkeypatch.setattr(bulk_import, 'READ_CHUNK_SIZE', chunk_size)
+    items = [{'username': 'ñandú'}, {'username': '株式'}, {'username': '🚀'}]
+    data = json.dumps({'orders': items}, ensure_ascii=False).encode('utf-8')
+    assert list(iter_json_array(io.BytesIO(data), 'orders')) == items
+
+
+def test_iter_json_array_empty_and_missing():
+    assert list(iter_json_array(io.BytesIO(b'{"orders": []}'), 'orders')) == []
+    assert list(iter_json_array(io.BytesIO(b'{"other": [1]}'), 'orders')) == []
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 64 * 1024])
+def test_iter_json_array_ignores_key_text_elsewhere(monkeypatch, chunk_size):
+    monkeypatch.setattr(bulk_import, 'READ_CHUNK_SIZE', chunk_size)
+    text = json.dumps({
+        'note': 'the "orders": [{"id": 0}] key',
+        'meta': {'orders': [{'id': -1}]},
+        'count': 12345,
+        'orders': [{'id': 1}, {'id': 2}],
+    })
+    assert list(iter_json_array(io.BytesIO(text.encode('utf-8')), 'orders')) == [{'id': 1}, {'id': 2}]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3])
+def test_iter_json_array_numbers_across_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(bulk_import, 'READ_CHUNK_SIZE', chunk_size)
+    data = b'{"orders": [123456, 7.25, -90]}'
+    assert list(iter_json_array(io.BytesIO(data), 'orders')) == [123456, 7.25, -90]
+
+
+def test_iter_json_array_not_an_object():
+    assert list(iter_json_array(io.BytesIO(b'[{"orders": [1]}]'), 'orders')) == []
+    assert list(iter_json_array(io.BytesIO(b'{"orders": null}'), 'orders')) == []
+
+
+def test_iter_json_array_truncated_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.BytesIO(b'{"orders": [{"id": 1}, {"id": '), 'orders'))
+
+
+# --- import_orders ---
+
+def test_import_keeps_ids_and_existing_orders(db):
+    import_orders(db, [('upsert', order(3))])
+    stats = import_orders(db, [('upsert', order(3, username='other')), ('upsert', order(8))])
+    assert stats['imported'] == 1
+    assert rows(db) == {3: ('a', 100000000, 'pending'), 8: ('a', 100000000, 'pending')}
+
+
+def test_import_later_records_replace_earlier(db):
+    import_orders(db, [('upsert', order(1, amount='1')), ('upsert', order(1, amount='2', status='filled'))])
+    assert rows(db) == {1: ('a', 200000000, 'filled')}
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 1000])
+def test_import_applies_deletes_in_record_order(db, batch_size):
+    records = [
+        ('upsert', order(1)),
+        ('delete', {'id': 1}),
+        ('upsert', order(2)),
+        ('delete', {'id': 2}),
+        ('upsert', order(2, username='again')),
+        ('upsert', order(3)),
+        ('delete', {'id': 3}),
+    ]
+    import_orders(db, records, batch_size=batch_size)
+    assert rows(db) == {2: ('again', 100000000, 'pending')}
+
+
+def test_import_skips_malformed_records(db):
+    stats = import_orders(db, [('upsert', order(1, amount='abc')), ('upsert', {'username': 'x'}), ('upsert', order(2))])
+    assert stats['skipped'] == 2
+    assert set(rows(db)) == {2}
+
+
+def test_import_reports_pairs_with_new_pending_orders(db):
+    import_orders(db, [('upsert', order(1))])
+    stats = import_orders(db, [
+        ('upsert', order(1)),
+        ('upsert', order(2, base='BEE', status='filled')),
+        ('upsert', order(3, base='SWAP.BTC')),
+    ])
+    assert stats['pairs'] == [['SWAP.BTC', 'SWAP.HIVE']]
@@ -0,0 +1,66 @@
+import sqlite3
+
+import app
+
+V0_ORDERS_TABLE_SQL = '''CREATE TABLE orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT,
+    base TEXT,
+    quote TEXT,
+    amount TEXT,
+    price TEXT,
+    side TEXT,
+    status TEXT DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+
+def migrate(rows):
+    conn = sqlite3.connect(':memory:')
+    c = conn.cursor()
+    c.execute(V0_ORDERS_TABLE_SQL)
+    c.executemany('INSERT INTO orders (id, username, base, quote, amount, price, side, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    app.migrate_orders_v1(c)
+    return {row[0]: row[1:] for row in c.execute('SELECT id, amount, price, status FROM orders')}
+
+
+def test_text_columns_become_units():
+    orders = migrate([
+        (7, 'a', 'PEK', 'SWAP.HIVE', '10', '0.5', 'buy', 'pending'),
+        (9, 'b', 'PEK', 'SWAP.HIVE', '1.123456789', '2', 'sell', 'pending'),
+    ])
+    # Ids are kept; extra digits are truncated
+    assert orders[7] == (1000000000, 50000000, 'pending')
+    assert orders[9] == (112345678, 200000000, 'pending')
+
+
+def test_invalid_values_are_rejected():
+    orders = migrate([
+        (1, 'a', 'PEK', 'SWAP.HIVE', 'abc', '1', 'buy', 'pending'),
+        (2, 'a', 'PEK', 'SWAP.HIVE', '-1', '1', 'buy', 'pending'),
+    ])
+    assert orders[1] == (0, 0, 'rejected')
+    assert orders[2] == (0, 0, 'rejected')
+
+
+def test_pending_orders_rounding_to_zero_are_rejected():
+    orders = migrate([
+        (1, 'a', 'PEK', 'SWAP.HIVE', '0.000000001', '1', 'buy', 'pending'),
+        (2, 'a', 'PEK', 'SWAP.HIVE', '1', '0', 'sell', 'pending'),
+        (3, 'a', 'PEK', 'SWAP.HIVE', '0', '1', 'sell', 'filled'),
+    ])
+    assert orders[1][2] == 'rejected'
+    assert orders[2][2] == 'rejected'
+    # A filled order has nothing left; it stays filled
+    assert orders[3] == (0, 100000000, 'filled')
+
+
+def test_new_orders_continue_after_migrated_ids():
+    conn = sqlite3.connect(':memory:')
+    c = conn.cursor()
+    c.execute(V0_ORDERS_TABLE_SQL)
+    c.execute("INSERT INTO orders (id, username, base, quote, amount, price, side) VALUES (41, 'a', 'PEK', 'SWAP.HIVE', '1', '1', 'buy')")
+    app.migrate_orders_v1(c)
+    c.execute("INSERT INTO orders (username, base, quote, amount, price, side) VALUES ('b', 'PEK', 'SWAP.HIVE', 1, 1, 'sell')")
+    assert c.lastrowid == 42
+    assert c.execute("SELECT name FROM sqlite_master WHERE name = 'orders_v0'").fetchone() is None
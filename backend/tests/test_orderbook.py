@@ -0,0 +1,82 @@
+from orderbook import Order, OrderBook
+
+
+def make_book(*orders):
+    book = OrderBook('PEK', 'SWAP.HIVE')
+    for order in orders:
+        book.add(order)
+    return book
+
+
+def test_best_price_wins():
+    book = make_book(
+        Order(1, 'a', 'buy', 100, 5),
+        Order(2, 'b', 'buy', 120, 5),
+        Order(3, 'c', 'sell', 150, 5),
+        Order(4, 'd', 'sell', 130, 5),
+    )
+    assert book.best_bid().id == 2
+    assert book.best_ask().id == 4
+
+
+def test_same_price_fills_in_arrival_order():
+    book = make_book(
+        Order(1, 'a', 'sell', 100, 5),
+        Order(2, 'b', 'sell', 100, 5),
+        Order(3, 'c', 'buy', 100, 10),
+    )
+    buy, sell, price, amount = book.next_match()
+    assert (buy.id, sell.id, price, amount) == (3, 1, 100, 5)
+    book.apply_fill(buy, sell, amount)
+    buy, sell, price, amount = book.next_match()
+    assert (buy.id, sell.id, price, amount) == (3, 2, 100, 5)
+    book.apply_fill(buy, sell, amount)
+    assert book.next_match() is None
+    assert len(book) == 0
+
+
+def test_partial_fill_leaves_remainder_at_head():
+    book = make_book(
+        Order(1, 'a', 'sell', 100, 3),
+        Order(2, 'b', 'buy', 110, 10),
+    )
+    buy, sell, price, amount = book.next_match()
+    # Trades at the resting sell price
+    assert (price, amount) == (100, 3)
+    book.apply_fill(buy, sell, amount)
+    assert book.best_ask() is None
+    assert book.best_bid().id == 2
+    assert book.best_bid().amount == 7
+    assert book.depth('buy') == [(110, 7)]
+
+
+def test_no_match_when_prices_do_not_cross():
+    book = make_book(
+        Order(1, 'a', 'buy', 99, 5),
+        Order(2, 'b', 'sell', 100, 5),
+    )
+    assert book.next_match() is None
+
+
+def test_dust_counts_as_filled():
+    book = OrderBook('PEK', 'SWAP.HIVE', dust=1)
+    book.add(Order(1, 'a', 'sell', 100, 10))
+    book.add(Order(2, 'b', 'buy', 100, 9))
+    buy, sell, _, amount = book.next_match()
+    book.apply_fill(buy, sell, amount)
+    assert len(book) == 0
+
+
+def test_duplicate_id_rests_once():
+    book = OrderBook('PEK', 'SWAP.HIVE')
+    assert book.add(Order(1, 'a', 'buy', 100, 5))
+    assert not book.add(Order(1, 'a', 'buy', 100, 5))
+    assert book.count('buy') == 1
+
+
+def test_filled_id_can_be_added_again_after_clear():
+    book = make_book(Order(1, 'a', 'buy', 100, 5))
+    book.clear()
+    assert len(book) == 0
+    assert book.best_bid() is None
+    assert book.add(Order(1, 'a', 'buy', 100, 5))
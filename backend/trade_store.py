@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+# Local copy of Hive Engine market.trades for the supported pairs.
+# A background sync pulls new trades per pair, resuming after the highest
+# upstream _id already stored, so /api/history can page through history with
+# an indexed keyset query instead of calling Hive Engine on every request.
+
+TRADES_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS trades (
+    base TEXT NOT NULL,
+    quote TEXT NOT NULL,
+    trade_id INTEGER NOT NULL,
+    type TEXT,
+    price TEXT,
+    quantity TEXT,
+    volume TEXT,
+    timestamp INTEGER,
+    data TEXT,
+    PRIMARY KEY (base, quote, trade_id)
+) WITHOUT ROWID'''
+
+SYNC_BATCH_SIZE = 1000
+MAX_PAGE_SIZE = 500
+
+
+class TradeStore:
+    def __init__(self, db):
+        self.db = db
+
+    def init_db(self):
+        with self.db.connection() as conn:
+            conn.execute(TRADES_TABLE_SQL)
+            conn.commit()
+
+    def insert_trades(self, base, quote, trades):
+        """Store upstream trade rows; rows already stored are ignored. Returns rows inserted."""
+        rows = [
+            (base, quote, int(t['_id']), t.get('type'), t.get('price'), t.get('quantity'),
+             t.get('volume'), t.get('timestamp'), json.dumps(t))
+            for t in trades if t.get('_id') is not None
+        ]
+        if not rows:
+            return 0
+        with self.db.connection() as conn:
+            c = conn.cursor()
+            before = conn.total_changes
+            c.executemany('''INSERT OR IGNORE INTO trades (base, quote, trade_id, type, price, quantity, volume, timestamp, data)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            conn.commit()
+            inserted = conn.total_changes - before
+        return inserted
+
+    def last_trade_id(self, base, quote):
+        with self.db.connection() as conn:
+            row = conn.execute('SELECT MAX(trade_id) FROM trades WHERE base=? AND quote=?', (base, quote)).fetchone()
+        return row[0]
+
+    def trades_after(self, base, quote, after_id=None, limit=1000):
+        """Trades oldest first, strictly newer than the `after_id` trade id"""
+        with self.db.connection() as conn:
+            rows = conn.execute('SELECT data FROM trades WHERE base=? AND quote=? AND trade_id > ? ORDER BY trade_id ASC LIMIT ?',
+                                (base, quote, -1 if after_id is None else int(after_id), int(limit))).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def page(self, base, quote, before=None, limit=50):
+        """Trades newest first, strictly older than the `before` trade id"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        with self.db.connection() as conn:
+            if before is None:
+                rows = conn.execute('SELECT data FROM trades WHERE base=? AND quote=? ORDER BY trade_id DESC LIMIT ?',
+                                    (base, quote, limit)).fetchall()
+            else:
+                rows = conn.execute('SELECT data FROM trades WHERE base=? AND quote=? AND trade_id < ? ORDER BY trade_id DESC LIMIT ?',
+                                    (base, quote, int(before), limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class TradeSync:
+    """Background thread that keeps a TradeStore in step with Hive Engine"""
+
+    def __init__(self, store, client, pairs, interval=5.0, on_trades=None):
+        self.store = store
+        self.client = client
+        self.pairs = pairs
+        self.interval = interval
+        # Called as on_trades(base, quote, new_trades) with trades oldest first
+        self.on_trades = on_trades
+        self.last_sync = None
+
+    def sync_pair(self, base, quote):
+        last_id = self.store.last_trade_id(base, quote)
+        total = 0
+        while True:
+            query = {"symbol": f"{base}:{quote}"}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            trades = self.client.find('market', 'trades', query, limit=SYNC_BATCH_SIZE,
+                                      indexes=[{"index": "_id", "descending": False}])
+            trades = [t for t in trades if t.get('_id') is not None]
+            if not trades:
+                break
+            total += self.store.insert_trades(base, quote, trades)
+            if self.on_trades:
+                self.on_trades(base, quote, trades)
+            last_id = max(int(t['_id']) for t in trades)
+            if len(trades) < SYNC_BATCH_SIZE:
+                break
+        return total
+
+    def sync_all(self):
+        for base, quote in self.pairs:
+            try:
+                self.sync_pair(base, quote)
+            except Exception as e:
+                print(f"Trade sync failed for {base}/{quote}: {e}")
+        self.last_sync = time.time()
+
+    def start(self):
+        def run():
+            while True:
+                self.sync_all()
+                time.sleep(self.interval)
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,45 @@
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+
+# Fixed-point helpers for token amounts and prices.
+# Orders are stored as integers scaled by the token precision so SQLite sorts
+# and compares them numerically. Amounts use the base token precision, prices
+# use the quote token precision.
+
+DEFAULT_PRECISION = 8
+
+TOKEN_PRECISION = {
+    'PEK': 8,
+    'PIMP': 8,
+    'SWAP.HIVE': 8,
+    'SWAP.BTC': 8,
+    'SWAP.LTC': 8,
+    'SWAP.ETH': 8,
+    'SWAP.DOGE': 8,
+    'SWAP.MATIC': 8,
+    'SWAP.HBD': 8,
+    'SWAP.BNB': 8,
+}
+
+def get_precision(symbol):
+    return TOKEN_PRECISION.get(symbol, DEFAULT_PRECISION)
+
+def to_units(value, symbol):
+    """Convert a decimal string/number to integer units, truncating extra digits.
+
+    Raises ValueError for anything that is not a finite, non-negative number.
+    """
+    try:
+        d = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Invalid number: {value!r}")
+    if not d.is_finite() or d < 0:
+        raise ValueError(f"Invalid number: {value!r}")
+    scale = Decimal(10) ** get_precision(symbol)
+    return int((d * scale).to_integral_value(rounding=ROUND_DOWN))
+
+def from_units(units, symbol):
+    """Format integer units as a fixed-precision decimal string"""
+    if units is None:
+        return None
+    precision = get_precision(symbol)
+    return format(Decimal(int(units)).scaleb(-precision), f'.{precision}f')
@@ -0,0 +1,10 @@
+# WSGI entry point for multi-process serving, e.g.:
+#   gunicorn -k gthread --threads 32 --timeout 120 -w 4 -b 0.0.0.0:8080 wsgi:app
+# Every worker builds its own app; one of them wins the leader lock and runs
+# the matcher and other background services. Do not use --preload: the
+# background threads would start in the master and not survive the fork.
+# Use the threaded worker (-k gthread): sync workers serve one connection at
+# a time, so /api/stream and ndjson exports would block the whole worker.
+from app import create_app
+
+app = create_app()